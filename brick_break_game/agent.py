@@ -0,0 +1,135 @@
+import torch
+import numpy as np
+import argparse
+import time
+import sys
+import os
+
+# the learning stack is shared with the snake game
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'snake_game'))
+from model import Linear_QNEt, QTrainer, QPolicy
+from replay import ReplayBuffer
+from brick_env import STATE_SIZE, MOVES
+from vector_brick_env import VectorBrickBreakEnv
+
+# parameters for learning
+MAX_MEMORY = 100_000
+BATCH_SIZE = 1000
+LR = 0.001
+GAMMA = 0.9
+TARGET_UPDATE = 0 # refresh a frozen target network every n train steps, 0 to train without one
+LOST_BALL_PENALTY = 10 # subtracted from the reward of the step the ball is lost
+EPSILON_START = 1.0 # share of random moves at the start of training
+EPSILON_END = 0.05
+EPSILON_STEPS = 100_000 # env steps over which the share of random moves decays
+REPORT_EVERY = 10 # seconds between progress reports
+MODEL_FILE = 'brick_model.pth' # weights at the end of training
+BEST_MODEL_FILE = 'brick_model_best.pth' # weights of the best mean score seen
+
+
+class BrickAgent:
+    '''
+    DQN agent for the brick break game, built from the snake learning stack: a
+    Linear_QNEt over the 7 brick features, a QTrainer, a float32 ReplayBuffer and a
+    QPolicy for batched action selection. Moves are one-hot [left, stay, right].
+    '''
+
+    def __init__(self, n_envs=1, seed=None):
+        self.n_steps = 0
+        self.n_games = 0
+        self.rng = np.random.default_rng(seed)
+
+        self.model = Linear_QNEt(STATE_SIZE, 256, len(MOVES))
+        self.memory = ReplayBuffer(MAX_MEMORY, (STATE_SIZE,), n_actions=len(MOVES),
+                                   state_dtype=np.float32, seed=seed)
+        self.trainer = QTrainer(self.model, lr=LR, gamma=GAMMA, target_update=TARGET_UPDATE)
+        self.policy = QPolicy(self.model, STATE_SIZE, max_batch=n_envs)
+
+    # share of random moves, decaying linearly with the env steps taken
+    @property
+    def epsilon(self):
+        progress = min(self.n_steps / EPSILON_STEPS, 1.0)
+        return EPSILON_START + (EPSILON_END - EPSILON_START) * progress
+
+    # epsilon greedy one-hot moves for a batch of states, one forward pass for all
+    def get_actions(self, states):
+        moves = self.policy.act_batch(states)
+        explore = self.rng.random(len(moves)) < self.epsilon
+        moves[explore] = self.rng.integers(0, len(MOVES), explore.sum())
+
+        final_moves = np.zeros((len(moves), len(MOVES)), dtype=np.int8)
+        final_moves[np.arange(len(moves)), moves] = 1
+        return final_moves
+
+    # one batched update on a sample of the replay memory
+    def train_step(self):
+        states, actions, rewards, next_states, dones = self.memory.sample(BATCH_SIZE)
+        self.trainer.train_step(states, actions, rewards, next_states, dones)
+
+
+# train on n_envs headless games stepped together by a VectorBrickBreakEnv
+# steps: env steps (summed over games) to train for, 0 to train until interrupted
+def train(n_envs=64, steps=0, seed=None):
+    torch.set_num_threads(1)
+    agent = BrickAgent(n_envs, seed=seed)
+    env = VectorBrickBreakEnv(n_envs, seed=seed)
+    if os.path.exists(os.path.join('./model', MODEL_FILE)):
+        agent.model.load(os.path.join('./model', MODEL_FILE))
+
+    scores = []
+    best_mean = -1.0
+    start = last_report = time.time()
+    report_steps = 0
+
+    states = env.reset()
+    try:
+        while not steps or agent.n_steps < steps:
+            final_moves = agent.get_actions(states)
+
+            # step all games, finished ones come back already reset
+            next_states, rewards, dones, score = env.step(final_moves)
+            rewards = rewards - LOST_BALL_PENALTY * env.lost
+            agent.memory.push_batch(states, final_moves, rewards, next_states, dones)
+            agent.n_steps += n_envs
+            report_steps += n_envs
+
+            # one batched update per vector step
+            agent.train_step()
+
+            if dones.any():
+                agent.n_games += int(dones.sum())
+                scores.extend(score[dones].tolist())
+            states = next_states
+
+            now = time.time()
+            if now - last_report >= REPORT_EVERY:
+                recent = scores[-100:]
+                mean = sum(recent) / len(recent) if recent else 0.0
+                print(f'Steps: {agent.n_steps} Games: {agent.n_games} Mean score (last 100): {mean:.2f} '
+                      f'Epsilon: {agent.epsilon:.2f} Steps/s: {report_steps / (now - last_report):.0f}')
+                last_report, report_steps = now, 0
+
+                # keep the weights of the best recent mean score
+                if recent and mean > best_mean:
+                    best_mean = mean
+                    agent.model.save(BEST_MODEL_FILE)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # the final weights, the next run starts from them
+        agent.model.save(MODEL_FILE)
+
+    elapsed = time.time() - start
+    print(f'Trained {agent.n_steps} steps over {agent.n_games} games in {elapsed:.1f}s '
+          f'({agent.n_steps / elapsed:.0f} steps/s)')
+    return agent
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train a DQN agent on the brick break game')
+    parser.add_argument('--envs', type=int, default=64, help='number of headless games to step together')
+    parser.add_argument('--steps', type=int, default=0, help='env steps to train for (default: until interrupted)')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    train(args.envs, args.steps, args.seed)
@@ -1,11 +1,13 @@
 import pygame
-import random
+import math
+import copy
+import os
 from enum import Enum
 from collections import namedtuple
 import numpy as np
 
-pygame.init()
-font = pygame.font.Font('snake_game/arial.ttf', 25)
+# The font is shared with the snake game and only loaded when the game is rendered
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'snake_game', 'arial.ttf')
 
 class Direction(Enum):
     RIGHT = 1
@@ -22,92 +24,181 @@ BLUE2 = (0, 100, 255)
 BLACK = (0,0,0)
 
 BLOCK_SIZE = 20
-SPEED = 20
+SPEED = 20 # game steps per second of wall time when rendered
+FPS = 60 # frames drawn per second when rendered
+MAX_FRAME_TIME = 0.25 # seconds of game time a rendered frame catches up on at most
+MAX_BOUNCES = 4 # impacts resolved per frame, the rest of the frame is dropped after that
+FAR = 1e9 # walls are boxes reaching this far out of the board
+SLAB_LOOP_MAX = 64 # boxes up to which the collision solver loops over plain floats instead of numpy
+
+
+def _first_impact(boxes: list, x: float, y: float, vx: float, vy: float, t_max: float) -> tuple:
+    '''
+    Earliest impact of the point (x, y) moving by (vx, vy) per unit of time with any of
+    the boxes (tuples of min x, min y, max x, max y), within t_max. Ray vs box slab
+    test, looping over plain floats for the handful of boxes near a path and over all
+    boxes at once in numpy for longer lists. Returns (time, box index, flip_x, flip_y),
+    with an index of None if nothing is hit. Boxes the point is already in or only
+    grazes are ignored.
+    '''
+    # axis aligned moves divide by zero, which numpy turns into infinities
+    if len(boxes) > SLAB_LOOP_MAX or not vx or not vy:
+        return _first_impact_numpy(np.array(boxes, dtype=float).reshape(-1, 4), x, y, vx, vy, t_max)
+
+    inv_x, inv_y = 1.0 / vx, 1.0 / vy
+    best, best_i, flip_x, flip_y = math.inf, None, False, False
+    for i, (min_x, min_y, max_x, max_y) in enumerate(boxes):
+        t1x, t2x = (min_x - x) * inv_x, (max_x - x) * inv_x
+        t1y, t2y = (min_y - y) * inv_y, (max_y - y) * inv_y
+        near_x, near_y = min(t1x, t2x), min(t1y, t2y)
+        t_near = max(near_x, near_y)
+        if 0 <= t_near < best and t_near <= t_max and t_near < min(max(t1x, t2x), max(t1y, t2y)):
+            # the slab entered last is the face that was hit, both on a corner
+            best, best_i, flip_x, flip_y = t_near, i, near_x >= near_y, near_y >= near_x
+    if best_i is None:
+        return 0.0, None, False, False
+    return float(best), best_i, flip_x, flip_y
+
+
+def _first_impact_numpy(boxes: np.ndarray, x: float, y: float, vx: float, vy: float, t_max: float) -> tuple:
+    '''
+    _first_impact over a (k, 4) array of boxes, all of them at once.
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv = 1.0 / np.array([vx, vy])
+        t1 = (boxes[:, :2] - (x, y)) * inv
+        t2 = (boxes[:, 2:] - (x, y)) * inv
+    near = np.minimum(t1, t2)
+    t_near = near.max(axis=1)
+    t_far = np.maximum(t1, t2).min(axis=1)
+    t_near = np.where((t_near >= 0) & (t_near < t_far) & (t_near <= t_max), t_near, np.inf)
+
+    i = int(t_near.argmin())
+    if t_near[i] == np.inf:
+        return 0.0, None, False, False
+    # the slab entered last is the face that was hit, both on a corner
+    return float(t_near[i]), i, bool(near[i, 0] >= near[i, 1]), bool(near[i, 1] >= near[i, 0])
+
 
 class Ball:
 
-    def __init__(self, loc: Point, w, h):
+    def __init__(self, loc: Point, w, h, rng: np.random.Generator):
         self.position = loc
         self.init_pos = loc
         self.w = w
         self.h = h
         self.ball_dim = BLOCK_SIZE//2
         
-        self.angle = random.randint(0, 359) + 0.01  # Added to avoid divide by zero errors later
-        self.at_wall = False
+        self.angle = int(rng.integers(0, 360)) + 0.01  # Added to avoid axis aligned moves
 
-    def update_angle(self, blocker: Point = None) -> None:
-        if not blocker:
-            strtx, strty =  self.ball_dim, self.ball_dim
-            endx, endy = self.w - self.ball_dim, self.h - self.ball_dim
-        else:
-            strtx, strty = blocker.x, blocker.y
-            endx, endy = blocker.x + BLOCK_SIZE, blocker.y + BLOCK_SIZE
-        if (int(self.position.x) + self.ball_dim == strtx or int(self.position.x) == endx) and \
-            (int(self.position.y) + self.ball_dim == strty or int(self.position.y) == endy):
-            self.angle = (self.angle + 180) % 360
-        elif int(self.position.x) + self.ball_dim == strtx or int(self.position.x) == endx:
-            if self.angle >= 180:
-                self.angle += 2*(270 - self.angle)
-            else:
-                self.angle += 2*(90 - self.angle)
+    def velocity(self, speed: float) -> tuple:
+        '''
+        Displacement per frame in screen coordinates (y axis points down).
+        '''
+        angle = np.deg2rad(self.angle)
+        return float(np.cos(angle))*speed, -float(np.sin(angle))*speed
 
-        elif int(self.position.y) + self.ball_dim == strty or int(self.position.y) == endy:
-            if np.cos(np.deg2rad(self.angle)) <= 0:
-                self.angle += 2*(180 - self.angle)
-            else:
-                self.angle = 360 - self.angle
+    def bounce(self, flip_x: bool, flip_y: bool) -> None:
+        '''
+        Reflects the direction off a vertical (flip_x) and/or horizontal (flip_y) surface.
+        '''
+        if flip_x:
+            self.angle = (180 - self.angle) % 360
+        if flip_y:
+            self.angle = (360 - self.angle) % 360
 
 
 class BrickBreakGame:
 
-    def __init__(self, w=640, h=480, paddle_length=4, n_bricks=20, brick_depth_ratio=0.3):
+    def __init__(self, w=640, h=480, paddle_length=4, n_bricks=20, brick_depth_ratio=0.3,
+                 seed=None, ball_speed=BLOCK_SIZE):
+        '''
+        Headless simulation of the game: every play_step advances the world by one fixed
+        timestep, with no display or clock, so it runs as fast as the cpu allows. Draw
+        it with a BrickBreakRenderer. seed seeds the game's own random generator (brick
+        layout and ball angle). ball_speed is in pixels per step.
+        '''
         self.w = w - BLOCK_SIZE
         self.h = h - BLOCK_SIZE
         self.n_bricks = n_bricks
         self.brick_depth = int(self.h * brick_depth_ratio)
-        # init display
-        self.display = pygame.display.set_mode((self.w, self.h))
-        pygame.display.set_caption('Brick Break')
-        self.clock = pygame.time.Clock()
+        self.ball_speed = ball_speed
+        self.rng = np.random.default_rng(seed)
         self.paddle_len = paddle_length
+
+        # Brick bitmap over the whole board, one cell per block (bricks may sit on the
+        # column right of the board, as in the original layout)
+        self.brick_grid = np.zeros((self.h // BLOCK_SIZE + 1, self.w // BLOCK_SIZE + 1), dtype=bool)
+
+        # Left, right and top walls as boxes the ball's top left corner cannot enter
+        ball_dim = BLOCK_SIZE//2
+        self._wall_boxes = [(-FAR, -FAR, 0.0, FAR),
+                            (self.w - ball_dim, -FAR, FAR, FAR),
+                            (-FAR, -FAR, FAR, 0.0)]
         self.reset()
 
-    def reset(self) -> None:
+    def reset(self, seed=None) -> None:
+        '''
+        Starts a new game. A seed restarts the random generator, so a logged seed replays
+        the same layout.
+        '''
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
         self.paddle = []
         mid = (self.w / BLOCK_SIZE) // 2
         start_pos = mid - (self.paddle_len // 2)
         for block_id in range(self.paddle_len):
                 self.paddle.append(Point(x=(start_pos + block_id)*BLOCK_SIZE, y=self.h - BLOCK_SIZE))
         
-        brickset = set()
-        for brick_id in range(self.n_bricks):
-            brickset.add(Point(x=random.randint(0, (self.w)//BLOCK_SIZE )*BLOCK_SIZE,
-                               y=random.randint(0, (self.brick_depth)//BLOCK_SIZE )*BLOCK_SIZE))
-        self.bricks = list(brickset)
-        self.blocker = None
+        # One (col, row) draw per brick, bricks landing on the same cell merge into one
+        cells = self.rng.integers(0, [self.w//BLOCK_SIZE, self.brick_depth//BLOCK_SIZE],
+                                  size=(self.n_bricks, 2), endpoint=True)
+        self.brick_grid.fill(False)
+        self.brick_grid[cells[:, 1], cells[:, 0]] = True
+        self.bricks_left = int(self.brick_grid.sum())
         self.score = 0
+        self.frame_iteration = 0
+        self.game_over = False
         self.paddle_dir = Direction.RIGHT
-        self.ball = Ball(Point(self.w/2, self.h/2), self.w, self.h)
+        self.ball = Ball(Point(self.w/2, self.h/2), self.w, self.h, self.rng)
 
-    def play_step(self, action: list = None) -> None:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-        
-        self._move(action=action)
-        if self.blocker in self.bricks:
-            self.score += 1
-        self.bricks = [brick for brick in self.bricks if brick != self.blocker]
+    @property
+    def bricks(self) -> list:
+        '''
+        Bricks left as points (top left corners), built from the brick bitmap.
+        '''
+        return [Point(int(col)*BLOCK_SIZE, int(row)*BLOCK_SIZE) for row, col in np.argwhere(self.brick_grid)]
 
-        self._update_ui()
-        self.clock.tick(SPEED)
+    def clone(self) -> 'BrickBreakGame':
+        '''
+        Independent copy of the game for lookahead or batched simulation: a bitmap copy,
+        the paddle list, the ball and the random generator state.
+        '''
+        game = copy.copy(self)
+        game.brick_grid = self.brick_grid.copy()
+        game.paddle = list(self.paddle)
+        game.ball = copy.copy(self.ball)
+        game.rng = np.random.Generator(type(self.rng.bit_generator)(0))
+        game.rng.bit_generator.state = self.rng.bit_generator.state
+        return game
+
+    def play_step(self, action: list = None) -> tuple:
+        '''
+        Advances the game one timestep and returns (reward, done, score): the reward is
+        the number of bricks broken this step, the game is done once the ball drops past
+        the paddle or every brick is broken. Call reset() to play again.
+        '''
+        self.frame_iteration += 1
+        reward = self._move(action=action)
+        self.score += reward
+        done = self.game_over or not self.bricks_left
+        return reward, done, self.score
 
-    def _move(self, action: list = None):
+    def _move(self, action: list = None) -> int:
         self._move_paddle(action=action)
         
-        self._move_ball()
+        return self._move_ball()
 
     def _move_paddle(self, action: list = None) -> None:
         '''
@@ -127,7 +218,7 @@ class BrickBreakGame:
             # Check if moving right
             elif np.array_equal(action, [0, 0, 1]):
                 # Only move if not touching right side of screen
-                if self.paddle[-1].x + BLOCK_SIZE > self.w:
+                if self.paddle[-1].x + BLOCK_SIZE < self.w:
                     self.paddle.append(Point(x=self.paddle[-1].x + BLOCK_SIZE, y=self.h - BLOCK_SIZE))
                     self.paddle.pop(0)
             
@@ -152,112 +243,139 @@ class BrickBreakGame:
                 self.paddle.insert(0, Point(x=self.paddle[0].x - BLOCK_SIZE, y=self.h - BLOCK_SIZE))
                 self.paddle.pop()
 
-    def _move_ball(self) -> None:
-        
-        if self.ball.at_wall:
-            self.ball.update_angle(self.blocker)
-            self.ball.at_wall = False
-
-        potential_point = Point(self.ball.position.x + np.cos(np.deg2rad(self.ball.angle))*BLOCK_SIZE, \
-                                self.ball.position.y + np.sin(np.deg2rad(360 - self.ball.angle))*BLOCK_SIZE)  # Flip because y axis is inverted
-
-        if self.ball.position.y + self.ball.ball_dim > self.h:
-            self.reset()
-        else:
-            blocker_shrinkage, self.blocker = self._get_blocker_shrinkage()
-
-            if potential_point.x + self.ball.ball_dim > self.w or potential_point.x < 0 or potential_point.y < 0 or blocker_shrinkage != 1.0:
-
-                if np.cos(np.deg2rad(self.ball.angle)) >= 0:
-                    tol_x = self.w - (self.ball.position.x + self.ball.ball_dim)
-                else:
-                    tol_x = self.ball.position.x
-                
-                if np.sin(np.deg2rad(360 - self.ball.angle)) >= 0:
-                    tol_y = self.h - (self.ball.position.y + self.ball.ball_dim) 
-                else:
-                    tol_y = self.ball.position.y
-
-                pct_bad_x = np.abs(tol_x / (np.cos(np.deg2rad(self.ball.angle))*BLOCK_SIZE))
-                pct_bad_y = np.abs(tol_y / (np.sin(np.deg2rad(360 - self.ball.angle))*BLOCK_SIZE))
-
-                req_shrinkage = min(pct_bad_x, pct_bad_y, blocker_shrinkage)
-                self.ball.at_wall = True
-            else:
-                req_shrinkage = 1.0
-            self.ball.position = Point(self.ball.position.x + np.cos(np.deg2rad(self.ball.angle))*BLOCK_SIZE*req_shrinkage, \
-                                    self.ball.position.y + np.sin(np.deg2rad(360 - self.ball.angle))*BLOCK_SIZE*req_shrinkage)
-
-    def _get_blocker_shrinkage(self) -> float:
-
-        relevant_shrinkages = [1.0]
-        closest_block = None
-        for block in self.paddle + self.bricks:
-            if block == self.blocker:
-                continue
-            if np.cos(np.deg2rad(self.ball.angle)) >= 0:
-                x_tol_frm_origin = block.x - (self.ball.position.x + self.ball.ball_dim)
-                
-            else:
-                x_tol_frm_origin = self.ball.position.x - (block.x + BLOCK_SIZE)
-
-            if abs(x_tol_frm_origin) > BLOCK_SIZE + self.ball.ball_dim:
-                continue
-
-            if x_tol_frm_origin < 0:
-                x_tol_frm_origin = BLOCK_SIZE
-
-            if np.sin(np.deg2rad(360 - self.ball.angle)) >= 0:
-                y_tol_frm_origin = block.y - (self.ball.position.y + self.ball.ball_dim)
-                
-            else:
-                y_tol_frm_origin = self.ball.position.y - (block.y + BLOCK_SIZE)
-
-            if abs(y_tol_frm_origin) > BLOCK_SIZE + self.ball.ball_dim:
-                continue
-
-            if y_tol_frm_origin < 0:
-                y_tol_frm_origin = BLOCK_SIZE
-
-            pct_bad_x = np.abs(x_tol_frm_origin / (np.cos(np.deg2rad(self.ball.angle))*BLOCK_SIZE))
-            pct_bad_y = np.abs(y_tol_frm_origin / (np.sin(np.deg2rad(360 - self.ball.angle))*BLOCK_SIZE))
-
-            feasible_shrinkages = [1.0]
-
-            if (block.x < self.ball.position.x + np.cos(np.deg2rad(self.ball.angle))*BLOCK_SIZE*pct_bad_y < block.x + BLOCK_SIZE) or \
-                block.x < (self.ball.position.x + self.ball.ball_dim) + np.cos(np.deg2rad(self.ball.angle))*BLOCK_SIZE*pct_bad_y < block.x + BLOCK_SIZE:
-                feasible_shrinkages.append(pct_bad_y)
-                
-            if (block.y < self.ball.position.y + np.sin(np.deg2rad(360 - self.ball.angle))*BLOCK_SIZE*pct_bad_x < block.y + BLOCK_SIZE) or \
-                block.y < (self.ball.position.y + self.ball.ball_dim) + np.sin(np.deg2rad(360 - self.ball.angle))*BLOCK_SIZE*pct_bad_x < block.y + BLOCK_SIZE:
-                feasible_shrinkages.append(pct_bad_x)
-
-            shrinkage = min(feasible_shrinkages)
-            if shrinkage < min(relevant_shrinkages):
-                closest_block = block
-                relevant_shrinkages.append(shrinkage)
+    def _move_ball(self) -> int:
+        '''
+        Moves the ball one frame with continuous collision detection and returns the
+        number of bricks broken. The ball travels along its path until the earliest
+        impact with a wall, brick or paddle cell, bounces, and goes on with the rest of
+        the frame, up to MAX_BOUNCES times, so it never tunnels through blocks whatever
+        its speed.
+        '''
+        ball = self.ball
+        x, y = ball.position
+        vx, vy = ball.velocity(self.ball_speed)
+        remaining = 1.0
+        broken = 0
+
+        for _ in range(MAX_BOUNCES):
+            boxes, (rows, cols) = self._collision_boxes(x, y, vx*remaining, vy*remaining)
+            t_hit, i, flip_x, flip_y = _first_impact(boxes, x, y, vx, vy, remaining)
+            if i is None:
+                x, y = x + vx*remaining, y + vy*remaining
+                break
+
+            # Move to the impact, snapping to the face that was hit so rounding never
+            # leaves the ball inside a block
+            x, y = x + vx*t_hit, y + vy*t_hit
+            if flip_x:
+                x = float(boxes[i][0] if vx > 0 else boxes[i][2])
+                vx = -vx
+            if flip_y:
+                y = float(boxes[i][1] if vy > 0 else boxes[i][3])
+                vy = -vy
+            ball.bounce(flip_x, flip_y)
+            remaining -= t_hit
+
+            if i < len(rows):
+                self.brick_grid[rows[i], cols[i]] = False
+                self.bricks_left -= 1
+                broken += 1
+
+        ball.position = Point(x, y)
+        if y + ball.ball_dim > self.h:
+            self.game_over = True
+        return broken
+
+    def _collision_boxes(self, x: float, y: float, dx: float, dy: float) -> tuple:
+        '''
+        Boxes the ball's corner (x, y) cannot enter while moving by (dx, dy): the bricks
+        and paddle cells near the path, grown by the ball size, followed by the walls.
+        Returns the list of (min x, min y, max x, max y) tuples and the (rows, cols)
+        bitmap cells of the bricks in the first entries. Bricks come from a slice of the
+        bitmap, so the cost depends on the length of the path and not on the number of
+        bricks.
+        '''
+        ball_dim = self.ball.ball_dim
+        lo_x, hi_x = min(x, x + dx) - BLOCK_SIZE, max(x, x + dx) + ball_dim
+        lo_y, hi_y = min(y, y + dy) - BLOCK_SIZE, max(y, y + dy) + ball_dim
+
+        # Bricks in the cells the path covers
+        n_rows, n_cols = self.brick_grid.shape
+        row0, row1 = max(math.ceil(lo_y / BLOCK_SIZE), 0), min(math.floor(hi_y / BLOCK_SIZE) + 1, n_rows)
+        col0, col1 = max(math.ceil(lo_x / BLOCK_SIZE), 0), min(math.floor(hi_x / BLOCK_SIZE) + 1, n_cols)
+        rows, cols = np.nonzero(self.brick_grid[row0:max(row1, row0), col0:max(col1, col0)])
+        rows = (rows + row0).tolist()
+        cols = (cols + col0).tolist()
+        blocks = [(col*BLOCK_SIZE, row*BLOCK_SIZE) for row, col in zip(rows, cols)]
+        blocks += [block for block in self.paddle if lo_x <= block.x <= hi_x and lo_y <= block.y <= hi_y]
+
+        boxes = [(bx - ball_dim, by - ball_dim, bx + BLOCK_SIZE, by + BLOCK_SIZE) for bx, by in blocks]
+        return boxes + self._wall_boxes, (rows, cols)
+
+
+class BrickBreakRenderer:
+    '''
+    Optional pygame view of a BrickBreakGame. The game itself never touches pygame, so
+    it runs headless and as fast as the cpu allows; the renderer opens the window and
+    loads the font when it is created.
+    '''
+
+    def __init__(self, game: BrickBreakGame, fps: int = FPS):
+        pygame.init()
+        self.game = game
+        self.fps = fps
+        self.display = pygame.display.set_mode((game.w, game.h))
+        pygame.display.set_caption('Brick Break')
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.Font(FONT_PATH, 25)
 
-        return min(relevant_shrinkages), closest_block
+    def draw(self) -> None:
+        # The window can only be closed while it is drawn
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                quit()
 
-    def _update_ui(self) -> None:
+        game = self.game
         self.display.fill(BLACK)
 
-        for pt in self.paddle:
-            # print(pt)
+        for pt in game.paddle:
             pygame.draw.rect(self.display, BLUE1, pygame.Rect(pt.x, pt.y, BLOCK_SIZE, BLOCK_SIZE))
             pygame.draw.rect(self.display, BLUE2, pygame.Rect(pt.x+4, pt.y+4, 12, 12))
 
-        for bricks in self.bricks:
-            # print(pt)
-            pygame.draw.rect(self.display, RED, pygame.Rect(bricks.x, bricks.y, BLOCK_SIZE, BLOCK_SIZE))
+        for row, col in np.argwhere(game.brick_grid):
+            pygame.draw.rect(self.display, RED, pygame.Rect(col*BLOCK_SIZE, row*BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE))
             
-        pygame.draw.rect(self.display, GREEN, pygame.Rect(self.ball.position.x, self.ball.position.y, self.ball.ball_dim, self.ball.ball_dim))
+        pygame.draw.rect(self.display, GREEN, pygame.Rect(game.ball.position.x, game.ball.position.y, game.ball.ball_dim, game.ball.ball_dim))
         
-        text = font.render(f"Score: {str(self.score)}", True, WHITE)
+        text = self.font.render(f"Score: {str(game.score)}", True, WHITE)
         self.display.blit(text, [0, 0])
         pygame.display.flip()
 
+    def tick(self, fps: int = None) -> float:
+        '''
+        Waits for the next frame and returns the seconds since the previous one.
+        '''
+        return self.clock.tick(fps or self.fps) / 1000
+
+    def run(self, policy=None, steps_per_second: int = SPEED) -> None:
+        '''
+        Plays the game in real time with a fixed timestep: the game advances exactly
+        steps_per_second steps per second of wall time, whatever the frame rate.
+        policy(game) returns the paddle moves, the paddle moves by itself if None.
+        '''
+        timestep = 1.0 / steps_per_second
+        accumulator = 0.0
+        while True:
+            # Catch up on the steps that are due, dropping the backlog after a stall
+            accumulator = min(accumulator + self.tick(), MAX_FRAME_TIME)
+            while accumulator >= timestep:
+                _, done, _ = self.game.play_step(policy(self.game) if policy else None)
+                if done:
+                    self.game.reset()
+                accumulator -= timestep
+            self.draw()
+
+
 if __name__ == '__main__':
-    block_test = BrickBreakGame()
-    while True:
-        block_test.play_step()
+    BrickBreakRenderer(BrickBreakGame()).run()
@@ -0,0 +1,117 @@
+import numpy as np
+import argparse
+import functools
+import time
+import sys
+import os
+
+# the environment specs and vector wrappers are shared with the snake game
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'snake_game'))
+from env import Discrete, Box, SyncVectorEnv, AsyncVectorEnv
+from brick_break_game import BrickBreakGame, BrickBreakRenderer, BLOCK_SIZE, SPEED
+
+# action index -> paddle move of BrickBreakGame.play_step (left, stay, right)
+MOVES = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+
+# state layout (7 features):
+# ball x, ball y, ball velocity x, ball velocity y (screen coordinates, y down),
+# paddle centre x, ball x relative to the paddle centre, share of bricks left
+# ball y is clipped to 1, the ball drops past the board on the step it is lost
+STATE_SIZE = 7
+
+
+def encode_state(game: BrickBreakGame, out: np.ndarray = None) -> np.ndarray:
+    '''
+    Writes the compact state of a BrickBreakGame into out (allocated if None) and
+    returns it. Positions are scaled by the board size.
+    '''
+    if out is None:
+        out = np.zeros(STATE_SIZE, dtype=np.float32)
+
+    ball = game.ball
+    angle = np.deg2rad(ball.angle)
+    paddle_x = (game.paddle[0].x + game.paddle[-1].x + BLOCK_SIZE) / 2
+    out[0] = ball.position.x / game.w
+    out[1] = min(ball.position.y / game.h, 1.0)
+    out[2] = np.cos(angle)
+    out[3] = -np.sin(angle)
+    out[4] = paddle_x / game.w
+    out[5] = (ball.position.x + ball.ball_dim / 2 - paddle_x) / game.w
+    out[6] = game.bricks_left / game.n_bricks
+    return out
+
+
+def encode_states(ball_x: np.ndarray, ball_y: np.ndarray, angle: np.ndarray, paddle_x: np.ndarray,
+                  bricks_left: np.ndarray, w: int, h: int, paddle_len: int, n_bricks: int,
+                  out: np.ndarray = None) -> np.ndarray:
+    '''
+    Batched encode_state for games kept in arrays, as by VectorBrickBreakEnv: ball
+    corners, ball angles in degrees, paddle left edges and bricks left per game.
+    Returns (n_games, 7) float32, written into out if given.
+    '''
+    if out is None:
+        out = np.zeros((len(ball_x), STATE_SIZE), dtype=np.float32)
+
+    rad = np.deg2rad(angle)
+    ball_dim = BLOCK_SIZE//2
+    paddle_center = paddle_x + paddle_len*BLOCK_SIZE / 2
+    out[:, 0] = ball_x / w
+    out[:, 1] = np.minimum(ball_y / h, 1.0)
+    out[:, 2] = np.cos(rad)
+    out[:, 3] = -np.sin(rad)
+    out[:, 4] = paddle_center / w
+    out[:, 5] = (ball_x + ball_dim / 2 - paddle_center) / w
+    out[:, 6] = bricks_left / n_bricks
+    return out
+
+
+class BrickBreakEnv:
+    '''
+    Gym-style wrapper of BrickBreakGame, same interface as SnakeEnv:
+
+        obs = env.reset(seed=0)
+        obs, reward, done, info = env.step(env.action_space.sample())
+
+    Actions are indices into [left, stay, right], observations the 7 float32 features
+    of encode_state. The reward is the number of bricks broken, info holds the score.
+    render=True draws every step at the game's real time speed.
+    '''
+
+    def __init__(self, render=False, seed=None, **kwargs):
+        self.game = BrickBreakGame(seed=seed, **kwargs)
+        self.renderer = BrickBreakRenderer(self.game) if render else None
+        self.action_space = Discrete(len(MOVES), seed=seed)
+        self.observation_space = Box(-1, 1, (STATE_SIZE,), np.float32)
+
+    def reset(self, seed=None) -> np.ndarray:
+        self.game.reset(seed=seed)
+        return encode_state(self.game)
+
+    def step(self, action: int) -> tuple:
+        reward, done, score = self.game.play_step(MOVES[action])
+        if self.renderer:
+            self.renderer.draw()
+            self.renderer.tick(SPEED)
+        return encode_state(self.game), reward, done, {'score': score}
+
+    def close(self) -> None:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Random play throughput of the brick break environments')
+    parser.add_argument('--envs', type=int, default=8)
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--async', dest='use_async', action='store_true', help='one worker process per environment')
+    args = parser.parse_args()
+
+    env_fns = [functools.partial(BrickBreakEnv, seed=i) for i in range(args.envs)]
+    envs = AsyncVectorEnv(env_fns) if args.use_async else SyncVectorEnv(env_fns)
+    envs.reset(seed=0)
+    rng = np.random.default_rng(0)
+    start = time.time()
+    for _ in range(args.steps):
+        envs.step(rng.integers(0, len(MOVES), args.envs))
+    elapsed = time.time() - start
+    envs.close()
+    print(f'{args.steps * args.envs / elapsed:.0f} env steps/s')
@@ -0,0 +1,200 @@
+import numpy as np
+from brick_break_game import BLOCK_SIZE, MAX_BOUNCES, FAR
+from brick_env import encode_states
+
+# action index -> paddle move in blocks (left, stay, right)
+PADDLE_MOVES = np.array([-1, 0, 1], dtype=np.int64)
+
+
+class VectorBrickBreakEnv:
+    '''
+    Steps N brick break games at once. Every game follows the rules of BrickBreakGame
+    (paddle moves, swept ball collisions with up to MAX_BOUNCES bounces per step, one
+    point per brick broken) but lives in numpy arrays: ball corners and angles, paddle
+    left edges and one brick bitmap per game. Each step runs the ray vs box solver
+    for all games together over a fixed window of bitmap cells around every ball.
+    Finished games are reset automatically inside step().
+    '''
+
+    def __init__(self, n_envs, w=640, h=480, paddle_length=4, n_bricks=20, brick_depth_ratio=0.3,
+                 seed=None, ball_speed=BLOCK_SIZE):
+        self.n_envs = n_envs
+        self.w = w - BLOCK_SIZE
+        self.h = h - BLOCK_SIZE
+        self.paddle_len = paddle_length
+        self.n_bricks = n_bricks
+        self.brick_depth = int(self.h * brick_depth_ratio)
+        self.ball_speed = ball_speed
+        self.ball_dim = BLOCK_SIZE//2
+        self.rng = np.random.default_rng(seed)
+
+        # cells a ball can reach within one step, the collision window is window x window
+        self.window = int((2*ball_speed + BLOCK_SIZE + self.ball_dim) // BLOCK_SIZE) + 2
+
+        # brick bitmaps, padded by a window on every side so windows never leave them
+        self.rows = self.h // BLOCK_SIZE + 1
+        self.cols = self.w // BLOCK_SIZE + 1
+        pad = self.window
+        self._padded = np.zeros((n_envs, self.rows + 2*pad, self.cols + 2*pad), dtype=bool)
+        self.brick_grid = self._padded[:, pad:pad + self.rows, pad:pad + self.cols]
+        self.bricks_left = np.zeros(n_envs, dtype=np.int64)
+
+        self.ball_x = np.zeros(n_envs)
+        self.ball_y = np.zeros(n_envs)
+        self.angle = np.zeros(n_envs)
+        self.paddle_x = np.zeros(n_envs)
+        self.score = np.zeros(n_envs, dtype=np.int64)
+        self.frame_iteration = np.zeros(n_envs, dtype=np.int64)
+        self.lost = np.zeros(n_envs, dtype=bool) # games of the last step that ended by losing the ball
+
+        # static boxes: paddle cell offsets and the left, right and top walls
+        self._paddle_offsets = np.arange(paddle_length) * BLOCK_SIZE
+        self._walls = np.array([[-FAR, -FAR, 0, FAR],
+                                [self.w - self.ball_dim, -FAR, FAR, FAR],
+                                [-FAR, -FAR, FAR, 0]], dtype=float)
+
+        self._all = np.arange(n_envs)
+        self.reset()
+
+    # reset every game and return the stacked states
+    def reset(self):
+        self._reset_games(self._all)
+        return self.get_states()
+
+    def _reset_games(self, idx):
+        if len(idx) == 0:
+            return
+        # bricks: one random cell per brick in the top rows, duplicates merge
+        cells = self.rng.integers(0, [self.w//BLOCK_SIZE, self.brick_depth//BLOCK_SIZE],
+                                  size=(len(idx), self.n_bricks, 2), endpoint=True)
+        self.brick_grid[idx] = False
+        self.brick_grid[idx[:, None], cells[:, :, 1], cells[:, :, 0]] = True
+        self.bricks_left[idx] = self.brick_grid[idx].sum(axis=(1, 2))
+
+        # ball in the middle with a random angle, paddle centred on the bottom row
+        self.ball_x[idx] = self.w / 2
+        self.ball_y[idx] = self.h / 2
+        self.angle[idx] = self.rng.integers(0, 360, len(idx)) + 0.01
+        self.paddle_x[idx] = ((self.w / BLOCK_SIZE) // 2 - self.paddle_len // 2) * BLOCK_SIZE
+
+        self.score[idx] = 0
+        self.frame_iteration[idx] = 0
+
+    # boxes the ball corners cannot enter this step, as (n_envs, k) arrays of min x,
+    # min y, max x, max y: the bitmap window around each ball (row major), the paddle
+    # cells and the walls. Also returns which boxes are live and the window's corner cell.
+    def _collision_boxes(self):
+        n, k = self.n_envs, self.window
+        reach = self.ball_speed + BLOCK_SIZE
+        row0 = np.ceil((self.ball_y - reach) / BLOCK_SIZE).astype(np.int64)
+        col0 = np.ceil((self.ball_x - reach) / BLOCK_SIZE).astype(np.int64)
+        rows = row0[:, None] + np.arange(k)
+        cols = col0[:, None] + np.arange(k)
+
+        pad = self.window
+        bricks = self._padded[self._all[:, None, None], rows[:, :, None] + pad, cols[:, None, :] + pad]
+
+        brick_x = np.broadcast_to(cols[:, None, :] * BLOCK_SIZE, (n, k, k)).reshape(n, k*k)
+        brick_y = np.broadcast_to(rows[:, :, None] * BLOCK_SIZE, (n, k, k)).reshape(n, k*k)
+        paddle_x = self.paddle_x[:, None] + self._paddle_offsets
+        paddle_y = np.full_like(paddle_x, self.h - BLOCK_SIZE)
+        walls = np.broadcast_to(self._walls.T[:, None, :], (4, n, len(self._walls)))
+
+        min_x = np.concatenate([brick_x - self.ball_dim, paddle_x - self.ball_dim, walls[0]], axis=1)
+        min_y = np.concatenate([brick_y - self.ball_dim, paddle_y - self.ball_dim, walls[1]], axis=1)
+        max_x = np.concatenate([brick_x + BLOCK_SIZE, paddle_x + BLOCK_SIZE, walls[2]], axis=1)
+        max_y = np.concatenate([brick_y + BLOCK_SIZE, paddle_y + BLOCK_SIZE, walls[3]], axis=1)
+        live = np.concatenate([bricks.reshape(n, k*k), np.ones((n, paddle_x.shape[1] + len(self._walls)), dtype=bool)], axis=1)
+        return (min_x, min_y, max_x, max_y), live, row0, col0
+
+    # advance every game by one step
+    # actions: (n_envs,) indices into [left, stay, right] or (n_envs, 3) one-hot moves
+    # returns stacked states, rewards (bricks broken), dones and scores (final score for
+    # games that just ended)
+    def step(self, actions):
+        actions = np.asarray(actions)
+        if actions.ndim == 2:
+            actions = actions.argmax(axis=1)
+        self.frame_iteration += 1
+
+        # move the paddles, never past the board edges
+        move = PADDLE_MOVES[actions]
+        blocked = ((move < 0) & (self.paddle_x < BLOCK_SIZE)) | \
+                  ((move > 0) & (self.paddle_x + self.paddle_len*BLOCK_SIZE >= self.w))
+        self.paddle_x += np.where(blocked, 0, move) * BLOCK_SIZE
+
+        reward = self._move_balls()
+        self.score += reward
+        self.lost = self.ball_y + self.ball_dim > self.h
+        done = self.lost | (self.bricks_left == 0)
+
+        # report final scores, then start finished games over
+        score = self.score.copy()
+        self._reset_games(self._all[done])
+
+        return self.get_states(), reward, done, score
+
+    # swept ball moves for all games together, see BrickBreakGame._move_ball
+    def _move_balls(self):
+        (min_x, min_y, max_x, max_y), live, row0, col0 = self._collision_boxes()
+        n_cells = self.window * self.window
+        rad = np.deg2rad(self.angle)
+        vx = np.cos(rad) * self.ball_speed
+        vy = -np.sin(rad) * self.ball_speed
+        x, y = self.ball_x, self.ball_y
+        remaining = np.ones(self.n_envs)
+        moving = np.ones(self.n_envs, dtype=bool)
+        reward = np.zeros(self.n_envs, dtype=np.int64)
+
+        for _ in range(MAX_BOUNCES):
+            # ray vs box slab test over every box of every game
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inv_x, inv_y = (1.0 / vx)[:, None], (1.0 / vy)[:, None]
+                t1x, t2x = (min_x - x[:, None]) * inv_x, (max_x - x[:, None]) * inv_x
+                t1y, t2y = (min_y - y[:, None]) * inv_y, (max_y - y[:, None]) * inv_y
+            near_x, near_y = np.minimum(t1x, t2x), np.minimum(t1y, t2y)
+            t_near = np.maximum(near_x, near_y)
+            t_far = np.minimum(np.maximum(t1x, t2x), np.maximum(t1y, t2y))
+            hit = live & (t_near >= 0) & (t_near < t_far) & (t_near <= remaining[:, None]) & moving[:, None]
+            t_near = np.where(hit, t_near, np.inf)
+            i = t_near.argmin(axis=1)
+            t_hit = t_near[self._all, i]
+
+            # games with a clear path finish their move
+            clear = moving & np.isinf(t_hit)
+            x[clear] += vx[clear] * remaining[clear]
+            y[clear] += vy[clear] * remaining[clear]
+            moving &= ~clear
+            g = self._all[moving]
+            if len(g) == 0:
+                break
+
+            # move to the impact, snap to the face that was hit and bounce
+            ig, tg = i[g], t_hit[g]
+            x[g] += vx[g] * tg
+            y[g] += vy[g] * tg
+            flip_x = near_x[g, ig] >= near_y[g, ig]
+            flip_y = near_y[g, ig] >= near_x[g, ig]
+            fx, fy = g[flip_x], g[flip_y]
+            x[fx] = np.where(vx[fx] > 0, min_x[fx, i[fx]], max_x[fx, i[fx]])
+            y[fy] = np.where(vy[fy] > 0, min_y[fy, i[fy]], max_y[fy, i[fy]])
+            vx[fx] = -vx[fx]
+            vy[fy] = -vy[fy]
+            self.angle[fx] = (180 - self.angle[fx]) % 360
+            self.angle[fy] = (360 - self.angle[fy]) % 360
+            remaining[g] -= tg
+
+            # break the bricks that were hit
+            b = g[ig < n_cells]
+            cell = i[b]
+            live[b, cell] = False
+            self.brick_grid[b, row0[b] + cell // self.window, col0[b] + cell % self.window] = False
+            self.bricks_left[b] -= 1
+            reward[b] += 1
+
+        return reward
+
+    # states for every game, same layout as BrickBreakEnv observations
+    def get_states(self, out=None):
+        return encode_states(self.ball_x, self.ball_y, self.angle, self.paddle_x, self.bricks_left,
+                             self.w, self.h, self.paddle_len, self.n_bricks, out)
@@ -0,0 +1,179 @@
+import torch
+import torch.multiprocessing as mp
+import numpy as np
+import argparse
+import queue
+import time
+import os
+from snake_game import SnakeGameAI
+from model import Linear_QNEt
+from agent import Agent, CHECKPOINT_EVERY, CHECKPOINT_REPLAY
+from checkpoint import Checkpointer
+from metrics import MetricsSink
+
+# parameters for the actor/learner split
+CHUNK_SIZE = 256 # transitions an actor collects before sending them to the learner
+SYNC_EVERY = 1000 # actor steps between checks for new learner weights
+PUBLISH_EVERY = 10 # learner updates between weight publications
+QUEUE_SIZE = 64 # chunks in flight before actors block
+QUEUE_TIMEOUT = 10 # seconds the learner waits for a chunk before checking on the actors
+
+
+# worker process: plays headless games with its own copy of the model and streams
+# transitions to the learner in chunks of tensors (sent through shared memory)
+def actor(rank,shared_model,version,transitions,stop):
+    # one thread per process, otherwise actors fight over the same cores
+    torch.set_num_threads(1)
+    np.random.seed(rank)
+    torch.manual_seed(rank)
+
+    # the lock of version guards the shared weights, so a copy never mixes two publications
+    agent = Agent()
+    with version.get_lock():
+        agent.model.load_state_dict(shared_model.state_dict())
+        local_version = version.value
+    game = SnakeGameAI(render=False,seed=rank)
+
+    # preallocated chunk buffers
+    states = np.zeros((CHUNK_SIZE,11),dtype=np.uint8)
+    actions = np.zeros((CHUNK_SIZE,3),dtype=np.int8)
+    rewards = np.zeros(CHUNK_SIZE,dtype=np.float32)
+    next_states = np.zeros((CHUNK_SIZE,11),dtype=np.uint8)
+    dones = np.zeros(CHUNK_SIZE,dtype=bool)
+    scores = []
+
+    n = 0
+    steps = 0
+    try:
+        while not stop.is_set():
+            # states are encoded straight into the chunk buffers
+            state_old = agent.get_state(game,out=states[n])
+            final_move = agent.get_action(state_old)
+            reward, done, score = game.play_step(final_move)
+            agent.get_state(game,out=next_states[n])
+
+            actions[n] = final_move
+            rewards[n] = reward
+            dones[n] = done
+            n += 1
+            steps += 1
+
+            if done:
+                game.reset()
+                agent.n_games += 1
+                scores.append(score)
+
+            # ship a full chunk
+            if n == CHUNK_SIZE:
+                chunk = tuple(torch.from_numpy(arr.copy()) for arr in (states,actions,rewards,next_states,dones))
+                while not stop.is_set():
+                    try:
+                        transitions.put((chunk,scores),timeout=1)
+                        break
+                    except queue.Full:
+                        pass
+                n = 0
+                scores = []
+
+            # pick up newer weights from the learner
+            if steps % SYNC_EVERY == 0 and version.value != local_version:
+                with version.get_lock():
+                    local_version = version.value
+                    agent.model.load_state_dict(shared_model.state_dict())
+    except KeyboardInterrupt:
+        # ctrl-c reaches the whole process group, the learner shuts everything down
+        pass
+
+
+# learner process: owns the QTrainer and the replay memory, trains on the actor
+# transitions as they arrive and publishes its weights back to the actors
+def learn(n_actors,prioritized=False):
+    record = 0
+    tot_score = 0
+    tot_steps = 0
+    start = time.time()
+
+    agent = Agent(prioritized=prioritized)
+    checkpoints = Checkpointer()
+    counters = checkpoints.resume(agent,'./model/model.pth')
+    if counters is not None:
+        record, tot_score = counters['record'], counters['tot_score']
+    metrics = MetricsSink(start=agent.n_games)
+
+    # weights the actors copy from, kept in shared memory
+    shared_model = Linear_QNEt(11,256,3)
+    shared_model.load_state_dict(agent.model.state_dict())
+    shared_model.share_memory()
+    version = mp.Value('i',0)
+
+    transitions = mp.Queue(maxsize=QUEUE_SIZE)
+    stop = mp.Event()
+    actors = [mp.Process(target=actor,args=(rank,shared_model,version,transitions,stop),daemon=True)
+              for rank in range(n_actors)]
+    for p in actors:
+        p.start()
+
+    n_updates = 0
+    try:
+        while True:
+            try:
+                chunk, scores = transitions.get(timeout=QUEUE_TIMEOUT)
+            except queue.Empty:
+                # nothing will ever arrive once every actor is gone
+                if not any(p.is_alive() for p in actors):
+                    exitcodes = [p.exitcode for p in actors]
+                    raise RuntimeError(f'all actors exited (exit codes {exitcodes}), stopping the learner')
+                continue
+            except OSError:
+                # a chunk still queued by an actor that died, its shared memory went with it
+                continue
+            states, actions, rewards, next_states, dones = chunk
+            tot_steps += len(rewards)
+
+            # remember the chunk and train on it like the short memory
+            agent.memory.push_batch(states.numpy(),actions.numpy(),rewards.numpy(),next_states.numpy(),dones.numpy())
+            agent.train_short_memory(states,actions,rewards,next_states,dones)
+            n_updates += 1
+
+            # a long memory update for every finished game
+            for score in scores:
+                agent.n_games += 1
+                tot_score += score
+                agent.train_long_memory()
+                n_updates += 1
+
+                if score > record:
+                    record = score
+                    agent.model.save()
+
+                steps_per_sec = tot_steps / (time.time() - start)
+                print(f'Game: {agent.n_games} Score: {score} Record: {record} Steps/s: {steps_per_sec:.0f}')
+                metrics.log(score,tot_score / agent.n_games,record)
+
+                if agent.n_games % CHECKPOINT_EVERY == 0:
+                    checkpoints.save(agent,replay=CHECKPOINT_REPLAY,record=record,tot_score=tot_score)
+
+            # publish new weights (copied in place into the shared tensors, under the lock)
+            if n_updates >= PUBLISH_EVERY:
+                with version.get_lock():
+                    shared_model.load_state_dict(agent.model.state_dict())
+                    version.value += 1
+                n_updates = 0
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for p in actors:
+            p.join(timeout=5)
+        metrics.close()
+        checkpoints.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the snake agent with parallel actors and one learner')
+    parser.add_argument('--actors', type=int, default=max(1,(os.cpu_count() or 2) - 1), help='number of actor processes')
+    parser.add_argument('--prioritized', action='store_true', help='use prioritized experience replay')
+    args = parser.parse_args()
+
+    mp.set_start_method('spawn')
+    learn(args.actors,prioritized=args.prioritized)
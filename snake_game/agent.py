@@ -1,21 +1,37 @@
-import torch
 import random
 import numpy as np
-from collections import deque
-from snake_game import SnakeGameAI, Direction, Point
-from model import Linear_QNEt, QTrainer
-from helper import plot
+from snake_game import SnakeGameAI, BLOCK_SIZE
+from state import encode_state, encode_grid, STATE_SIZE, GRID_CHANNELS
+from vector_env import VectorSnakeEnv
+from model import Linear_QNEt, Conv_QNEt, QTrainer, QPolicy
+from replay import ReplayBuffer, PrioritizedReplayBuffer
+from metrics import MetricsSink
+from checkpoint import Checkpointer, CHECKPOINT_FOLDER
+from profiler import PhaseTimer
+import argparse
 import os
 
 # parameters for learning
 MAX_MEMORY = 100_000
+GRID_MAX_MEMORY = 20_000 # board observations are ~400x bigger than feature states
+GRID_SHAPE = (480//BLOCK_SIZE, 640//BLOCK_SIZE) # board rows and columns of the default game
 BATCH_SIZE = 1000
 LR = 0.001
+TARGET_UPDATE = 0 # refresh a frozen target network every n train steps, 0 to train without one
+CHECKPOINT_EVERY = 100 # games between checkpoints
+CHECKPOINT_REPLAY = True # include the replay memory in checkpoints
+PROFILE_REPORT_EVERY = 50 # games between phase timing reports when profiling
+MODEL_FILE = 'model.pth'
+GRID_MODEL_FILE = 'grid_model.pth' # conv net weights, kept apart from the feature model
+GRID_CHECKPOINT_FOLDER = os.path.join(CHECKPOINT_FOLDER,'grid')
 
 # class for the agent snake 
 class Agent:
 
-    def __init__(self):
+    # prioritized=True replays memories by TD error instead of uniformly
+    # script=True compiles the model with TorchScript for action selection
+    # observation='grid' sees the full board with a conv net instead of the 11 features
+    def __init__(self,prioritized=False,script=False,observation='features'):
         # number of games 
         self.n_games = 0
 
@@ -25,81 +41,54 @@ class Agent:
         # discount rate
         self.gamma = 0.9
 
-        self.memory = deque(maxlen=MAX_MEMORY) #popleft if over limit 
-        self.model = Linear_QNEt(11,256,3)
-        self.trainer = QTrainer(self.model,lr=LR,gamma=self.gamma)
+        # state shape and model for the observation type
+        self.observation = observation
+        if self.observation == 'grid':
+            state_shape = (GRID_CHANNELS,*GRID_SHAPE)
+            max_memory = GRID_MAX_MEMORY
+            self.model = Conv_QNEt(GRID_CHANNELS,*GRID_SHAPE,3)
+            self.model_file = GRID_MODEL_FILE
+            self.checkpoint_folder = GRID_CHECKPOINT_FOLDER
+        else:
+            state_shape = (STATE_SIZE,)
+            max_memory = MAX_MEMORY
+            self.model = Linear_QNEt(11,256,3)
+            self.model_file = MODEL_FILE
+            self.checkpoint_folder = CHECKPOINT_FOLDER
+
+        self.prioritized = prioritized
+        if self.prioritized:
+            self.memory = PrioritizedReplayBuffer(max_memory,state_shape)
+        else:
+            self.memory = ReplayBuffer(max_memory,state_shape) # overwrites oldest if over limit 
+        self.trainer = QTrainer(self.model,lr=LR,gamma=self.gamma,target_update=TARGET_UPDATE)
+        self.policy = QPolicy(self.model,state_shape,script=script)
         
         # length of snake 
         self.length = 3
 
     # return the state of the game based on current location
-    def get_state(self,game):
-        # get head of snake 
-        head = game.snake[0]
-
-        # check spaces directly around the snakes head 
-        point_l = Point(head.x - 20, head.y)
-        point_r = Point(head.x+20,head.y)
-        point_u = Point(head.x,head.y-20)
-        point_d = Point(head.x,head.y+20)
-
-        # booleans, only one true for the current direction 
-        dir_l = game.direction == Direction.LEFT
-        dir_r = game.direction == Direction.RIGHT
-        dir_u = game.direction == Direction.UP
-        dir_d = game.direction == Direction.DOWN
-
-        # create state as list of 11 tuples 
-        state = [
-            # danger straight
-            (dir_r and game.is_collision(point_r)) or
-            (dir_l and game.is_collision(point_l)) or 
-            (dir_u and game.is_collision(point_u)) or 
-            (dir_d and game.is_collision(point_d)),
-
-            # danger right 
-            (dir_d and game.is_collision(point_r)) or
-            (dir_u and game.is_collision(point_l)) or 
-            (dir_r and game.is_collision(point_u)) or 
-            (dir_l and game.is_collision(point_d)),
-
-            # danger left 
-            (dir_r and game.is_collision(point_r)) or
-            (dir_l and game.is_collision(point_l)) or 
-            (dir_u and game.is_collision(point_u)) or 
-            (dir_d and game.is_collision(point_d)),
-
-            # direction of movement
-            dir_l,
-            dir_r,
-            dir_u,
-            dir_d,
-
-            # food location
-            game.food.x < game.head.x, # food left 
-            game.food.x > game.head.x, # food right
-            game.food.y < game.head.y, # food up
-            game.food.y > game.head.y, # food down 
-        ]
-
-        # return the state  
-        return np.array(state, dtype=int)
+    # written into out if given, so callers can reuse a preallocated buffer
+    def get_state(self,game,out=None):
+        if self.observation == 'grid':
+            return encode_grid(game,out)
+        return encode_state(game,out)
     
     def remember(self,state,action,reward,next_state,done):
-        # add previous state information to memory que -> stored as one tuple 
-        self.memory.append((state,action,reward,next_state,done)) # popleft if exceeded max mem
+        # add previous state information to the replay memory
+        self.memory.push(state,action,reward,next_state,done) # overwrites oldest if exceeded max mem
 
     # train on all previous moves of all previous games 
     def train_long_memory(self):
-        # want 1000 steps from memory if memory has it 
-        if len(self.memory) > BATCH_SIZE:
-            mini_sample = random.sample(self.memory,BATCH_SIZE) # list of tuples 
-        # if les than 1000 memories, just take the whole thing
-        else:
-            mini_sample = self.memory
+        # prioritized: 1000 steps picked by priority, weighted in the loss, then reprioritized
+        if self.prioritized:
+            states, actions, rewards, next_states, dones, weights, idx = self.memory.sample(BATCH_SIZE)
+            td_errors = self.trainer.train_step(states,actions,rewards,next_states,dones,weights)
+            self.memory.update_priorities(idx,td_errors.numpy())
+            return
 
-        # break up samples by combining all states and actions and rewards...
-        states, actions, rewards, next_states, dones = zip(*mini_sample)
+        # want 1000 steps from memory if memory has it, else the whole thing
+        states, actions, rewards, next_states, dones = self.memory.sample(BATCH_SIZE)
 
         # train on 1000 or all memories 
         self.trainer.train_step(states,actions,rewards,next_states,dones) 
@@ -122,81 +111,191 @@ class Agent:
                 final_move[move] = 1
             # if not random, make a predicted action based on state 
             else:
-                state0 = torch.tensor(state,dtype=torch.float)
-                # list of three raw values --> output of the nn
-                prediction = self.model(state0) # forward function 
-
-                move = torch.argmax(prediction).item()
+                # best of the three raw values --> output of the nn
+                move = self.policy.act(state)
                 final_move[move] = 1
         # if not random, make a predicted action based on state 
         else:
-            state0 = torch.tensor(state,dtype=torch.float)
-            # list of three raw values --> output of the nn
-            prediction = self.model(state0) # forward function 
-
-            move = torch.argmax(prediction).item()
+            # best of the three raw values --> output of the nn
+            move = self.policy.act(state)
             final_move[move] = 1
     
         # return the move of the agent 
         return final_move
 
+    # batched get_action for many games at once: one one-hot move per row of states
+    def get_actions(self,states):
+        self.epsilon = 80 - self.n_games
+
+        # one forward pass for every game
+        moves = self.policy.act_batch(states)
 
-def train():
-    plot_scores = []
-    plot_mean_scores = []
+        # same exploration rule as get_action
+        if self.length > 7:
+            explore = np.random.randint(0,201,len(moves)) < self.epsilon
+            moves[explore] = np.random.randint(0,3,explore.sum())
+
+        final_moves = np.zeros((len(moves),3),dtype=int)
+        final_moves[np.arange(len(moves)),moves] = 1
+        return final_moves
+
+
+# headless=True trains without a window or frame cap
+# timer: PhaseTimer for per-phase timings, disabled by default
+def train(headless=False,prioritized=False,timer=None,observation='features',script=False):
     tot_score = 0
     record = 0
+    timer = timer or PhaseTimer()
+
+    agent = Agent(prioritized=prioritized,script=script,observation=observation)
+    game = SnakeGameAI(render=not headless)
 
-    agent = Agent()
-    game = SnakeGameAI()
+    # resume from the latest checkpoint, or start from the saved model if one exists
+    checkpoints = Checkpointer(agent.checkpoint_folder)
+    counters = checkpoints.resume(agent,os.path.join('./model',agent.model_file))
+    if counters is not None:
+        record, tot_score = counters['record'], counters['tot_score']
 
-    # Check if a saved model exists and load it
-    if os.path.exists('./model/model.pth'):
-        print('hi')
-        agent.model.load('./model/model.pth')
+    # scores are plotted to ./plots in the background, numbered on from a resumed game
+    metrics = MetricsSink(start=agent.n_games)
+
+    # two state buffers, the new state of one step is the old state of the next
+    state_old = agent.get_state(game)
+    state_new = np.zeros_like(state_old)
   
-    while True:
-        # get old state 
-        state_old = agent.get_state(game)
+    try:
+        while True:
+            # get move based on current state
+            with timer.phase('action'):
+                final_move = agent.get_action(state_old)
+
+            # perform move and get new state
+            with timer.phase('env'):
+                reward, done, score = game.play_step(final_move)
+            with timer.phase('state'):
+                agent.get_state(game,out=state_new)
+
+            # train short memory on one step 
+            with timer.phase('short_memory'):
+                agent.train_short_memory(state_old,final_move,reward,state_new,done)
+
+            # remember in replay memory 
+            with timer.phase('remember'):
+                agent.remember(state_old,final_move,reward,state_new,done)
+
+            # if game over, train over all previous moves of all previous games 
+            if done:
+                # reset the game 
+                with timer.phase('env'):
+                    game.reset()
+                agent.n_games += 1
+
+                # train on all moves of all games 
+                with timer.phase('long_memory'):
+                    agent.train_long_memory()
+
+                # set new high score if needed 
+                if score > record:
+                    record = score 
+                    # save current best model's weights
+                    with timer.phase('save'):
+                        agent.model.save(agent.model_file)
+
+                print(f'Game: {agent.n_games} Score: {score} Record: {record}')
+
+                tot_score += score 
+                mean_score = tot_score / agent.n_games
+                with timer.phase('plot'):
+                    metrics.log(score,mean_score,record)
+
+                if agent.n_games % CHECKPOINT_EVERY == 0:
+                    with timer.phase('checkpoint'):
+                        checkpoints.save(agent,replay=CHECKPOINT_REPLAY,record=record,tot_score=tot_score)
+
+                timer.end_game()
+                if timer.enabled and agent.n_games % PROFILE_REPORT_EVERY == 0:
+                    print(timer.report())
+
+            # new state becomes the old one (or the state of the fresh game)
+            state_old, state_new = state_new, state_old
+            if done:
+                with timer.phase('state'):
+                    agent.get_state(game,out=state_old)
+    finally:
+        metrics.close()
+        checkpoints.wait()
+    
 
-        # get move based on current state
-        final_move = agent.get_action(state_old)
 
-        # perform move and get new state
-        reward, done, score = game.play_step(final_move)
-        state_new = agent.get_state(game)
+# train on n_envs headless games stepped together by a VectorSnakeEnv
+def train_vectorized(n_envs,prioritized=False,observation='features',script=False):
+    tot_score = 0
+    record = 0
 
-        # train short memory on one step 
-        agent.train_short_memory(state_old,final_move,reward,state_new,done)
-        
-        # remember in deque 
-        agent.remember(state_old,final_move,reward,state_new,done)
-     
-        # if game over, train over all previous moves of all previous games 
-        if done:
-            # reset the game 
-            game.reset()
-            agent.n_games += 1
-
-            # train on all moves of all games 
-            agent.train_long_memory()
-
-            # set new high score if needed 
-            if score > record:
-                record = score 
-                # save current best model's weights
-                agent.model.save() 
-
-            print(f'Game: {agent.n_games} Score: {score} Record: {record}')
-
-            plot_scores.append(score)
-            tot_score += score 
-            mean_score = tot_score / agent.n_games
-            plot_mean_scores.append(mean_score)
-            plot(plot_scores,plot_mean_scores,record)
-    
+    agent = Agent(prioritized=prioritized,script=script,observation=observation)
+    env = VectorSnakeEnv(n_envs,observation=observation)
+
+    checkpoints = Checkpointer(agent.checkpoint_folder)
+    counters = checkpoints.resume(agent,os.path.join('./model',agent.model_file))
+    if counters is not None:
+        record, tot_score = counters['record'], counters['tot_score']
+    metrics = MetricsSink(start=agent.n_games)
+
+    states = env.reset()
+    try:
+        while True:
+            # one move for every game
+            final_moves = agent.get_actions(states)
+
+            # step all games, finished ones come back already reset
+            next_states, rewards, dones, scores = env.step(final_moves)
+
+            # train short memory on the whole batch of steps
+            agent.train_short_memory(states,final_moves,rewards,next_states,dones)
+
+            agent.memory.push_batch(states,final_moves,rewards,next_states,dones)
+
+            if dones.any():
+                for score in scores[dones]:
+                    agent.n_games += 1
+                    tot_score += score
+
+                    if score > record:
+                        record = score
+                        agent.model.save(agent.model_file)
+
+                    print(f'Game: {agent.n_games} Score: {score} Record: {record}')
+                    metrics.log(score,tot_score / agent.n_games,record)
+
+                    if agent.n_games % CHECKPOINT_EVERY == 0:
+                        checkpoints.save(agent,replay=CHECKPOINT_REPLAY,record=record,tot_score=tot_score)
+
+                # train on all moves of all games
+                agent.train_long_memory()
+
+            states = next_states
+    finally:
+        metrics.close()
+        checkpoints.wait()
 
 
 if __name__ == '__main__':
-    train()
+    parser = argparse.ArgumentParser(description='Train the snake agent')
+    parser.add_argument('--headless', action='store_true', help='train without rendering the game')
+    parser.add_argument('--envs', type=int, default=1, help='number of headless games to step together')
+    parser.add_argument('--prioritized', action='store_true', help='use prioritized experience replay')
+    parser.add_argument('--grid', action='store_true', help='observe the full board with a conv net')
+    parser.add_argument('--script', action='store_true', help='compile the model with TorchScript for action selection')
+    parser.add_argument('--profile', action='store_true', help='time every phase of the training loop')
+    parser.add_argument('--trace', choices=['cprofile','torch'], help='record a profiler trace')
+    parser.add_argument('--trace-start', type=int, default=10, help='game to start the trace at')
+    parser.add_argument('--trace-games', type=int, default=10, help='number of games to trace')
+    args = parser.parse_args()
+
+    observation = 'grid' if args.grid else 'features'
+    if args.envs > 1:
+        train_vectorized(args.envs,prioritized=args.prioritized,observation=observation,script=args.script)
+    else:
+        timer = PhaseTimer(enabled=args.profile,trace=args.trace,profile_start=args.trace_start,profile_games=args.trace_games)
+        train(headless=args.headless,prioritized=args.prioritized,timer=timer,observation=observation,script=args.script)
 
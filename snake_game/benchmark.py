@@ -0,0 +1,205 @@
+import torch
+import random
+import numpy as np
+import argparse
+import platform
+import json
+import time
+import sys
+from snake_game import SnakeGameAI, Point, BLOCK_SIZE, BODY
+from vector_env import VectorSnakeEnv
+from replay import ReplayBuffer, PrioritizedReplayBuffer
+from model import Linear_QNEt, QTrainer
+from agent import Agent, MAX_MEMORY, BATCH_SIZE, LR
+
+# no resource module on windows, the peak memory is reported as None there
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# what gets benchmarked
+SNAKE_LENGTHS = [3, 50, 200, 500]
+BATCH_SIZES = [1, 32, 256, 1000]
+VECTOR_SIZES = [1, 64, 256]
+MOVES = [[1,0,0],[0,1,0],[0,0,1]]
+
+
+def seed_all(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+# time fn n times after a warmup, latency percentiles in microseconds
+def latency(fn, n, warmup=10):
+    for _ in range(warmup):
+        fn()
+    times = np.zeros(n)
+    for i in range(n):
+        start = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - start
+    times *= 1e6
+    return {'n': n,
+            'mean_us': float(times.mean()),
+            'p50_us': float(np.percentile(times, 50)),
+            'p90_us': float(np.percentile(times, 90)),
+            'p99_us': float(np.percentile(times, 99)),
+            'per_sec': float(1e6 / times.mean())}
+
+
+# lay the snake out as a serpentine of the given length, head last, and rebuild its grid layer
+def grow_snake(game, length):
+    cells = []
+    for row in range(game.rows):
+        cols = range(game.cols) if row % 2 == 0 else reversed(range(game.cols))
+        cells.extend(Point(col*BLOCK_SIZE, row*BLOCK_SIZE) for col in cols)
+    game.snake = cells[:length][::-1]
+    game.head = game.snake[0]
+    game.grid[BODY] = 0
+    for pt in game.snake:
+        game._add(BODY, pt)
+    game._index_free()
+
+
+# headless play_step throughput with random moves
+def bench_play_step(seed, n):
+    seed_all(seed)
+    game = SnakeGameAI(render=False,seed=seed)
+
+    def step():
+        _, done, _ = game.play_step(random.choice(MOVES))
+        if done:
+            game.reset()
+    return latency(step, n)
+
+
+# state extraction, collision checks and action selection across snake lengths,
+# action selection both eager and compiled with TorchScript (same weights)
+def bench_agent(seed, n):
+    results = {}
+    for length in SNAKE_LENGTHS:
+        seed_all(seed)
+        agent = Agent()
+        scripted = Agent(script=True)
+        scripted.model.load_state_dict(agent.model.state_dict())
+        game = SnakeGameAI(render=False,seed=seed)
+        grow_snake(game, length)
+        state = agent.get_state(game)
+        buf = np.zeros_like(state)
+        snapshot = game.snapshot()
+
+        results[str(length)] = {
+            'get_state': latency(lambda: agent.get_state(game, out=buf), n),
+            'is_collision': latency(lambda: game.is_collision(Point(game.head.x + BLOCK_SIZE, game.head.y)), n),
+            'get_action': latency(lambda: agent.get_action(state), n),
+            'get_action_script': latency(lambda: scripted.get_action(state), n),
+            'snapshot': latency(game.snapshot, n),
+            'restore': latency(lambda: game.restore(snapshot), n),
+        }
+    return results
+
+
+# random transitions shaped like the agent's
+def random_batch(size):
+    states = np.random.randint(0, 2, (size, 11))
+    actions = np.eye(3, dtype=int)[np.random.randint(0, 3, size)]
+    rewards = np.random.randn(size)
+    next_states = np.random.randint(0, 2, (size, 11))
+    dones = np.random.rand(size) < 0.05
+    return states, actions, rewards, next_states, dones
+
+
+# one QTrainer update across batch sizes
+def bench_train_step(seed, n):
+    results = {}
+    for batch_size in BATCH_SIZES:
+        seed_all(seed)
+        trainer = QTrainer(Linear_QNEt(11, 256, 3), lr=LR, gamma=0.9)
+        batch = random_batch(batch_size)
+        results[str(batch_size)] = latency(lambda: trainer.train_step(*batch), n)
+    return results
+
+
+# sampling and the long memory update on a full replay memory, uniform and prioritized
+def bench_replay(seed, n):
+    results = {}
+    for name, prioritized in (('uniform', False), ('prioritized', True)):
+        seed_all(seed)
+        agent = Agent(prioritized=prioritized)
+        agent.memory.push_batch(*random_batch(MAX_MEMORY))
+
+        results[name] = {
+            'sample': {str(b): latency(lambda: agent.memory.sample(b), n) for b in BATCH_SIZES},
+            'train_long_memory': latency(agent.train_long_memory, max(n // 10, 10)),
+            'push': latency(lambda: agent.remember(*[x[0] for x in random_batch(1)]), n),
+        }
+    return results
+
+
+# batched env throughput, in env steps per second
+def bench_vector_env(seed, n):
+    results = {}
+    for n_envs in VECTOR_SIZES:
+        env = VectorSnakeEnv(n_envs, seed=seed)
+        rng = np.random.default_rng(seed)
+        stats = latency(lambda: env.step(rng.integers(0, 3, n_envs)), n)
+        stats['env_steps_per_sec'] = stats['per_sec'] * n_envs
+        results[str(n_envs)] = stats
+    return results
+
+
+# bytes held by the replay memories and peak resident memory of the run
+def memory_usage():
+    def nbytes(memory):
+        arrays = (memory.states, memory.next_states, memory.actions, memory.rewards, memory.dones)
+        total = sum(arr.nbytes for arr in arrays)
+        if hasattr(memory, 'tree'):
+            total += memory.tree.tree.nbytes
+        return total
+
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    max_rss = None
+    if resource is not None:
+        scale = 1 if sys.platform == 'darwin' else 1024
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return {'replay_bytes': nbytes(ReplayBuffer(MAX_MEMORY, (11,))),
+            'prioritized_replay_bytes': nbytes(PrioritizedReplayBuffer(MAX_MEMORY, (11,))),
+            'max_rss_bytes': max_rss}
+
+
+def run(seed=0, n=1000):
+    torch.set_num_threads(1)
+    results = {
+        'meta': {'seed': seed,
+                 'n': n,
+                 'batch_size': BATCH_SIZE,
+                 'python': platform.python_version(),
+                 'numpy': np.__version__,
+                 'torch': torch.__version__,
+                 'platform': platform.platform(),
+                 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'play_step': bench_play_step(seed, n*10),
+        'agent': bench_agent(seed, n),
+        'train_step': bench_train_step(seed, n // 10),
+        'replay': bench_replay(seed, n),
+        'vector_env': bench_vector_env(seed, n // 10),
+    }
+    results['memory'] = memory_usage()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the snake training stack')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-n', type=int, default=1000, help='timed calls per benchmark')
+    parser.add_argument('--out', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.seed, args.n), indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
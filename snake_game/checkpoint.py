@@ -0,0 +1,121 @@
+import torch
+import threading
+import copy
+import glob
+import os
+
+# parameters for checkpointing
+CHECKPOINT_FOLDER = './checkpoints'
+KEEP = 3 # newest checkpoints kept on disk
+
+
+class Checkpointer:
+    '''
+    Versioned training checkpoints: model, optimizer (Adam moments), target network,
+    agent counters, any extra counters of the training loop and optionally the replay
+    memory. save() snapshots everything on the calling thread (a few MB of copies) and
+    writes it on a background thread to checkpoint_<version>.pth via a temporary file
+    and an atomic rename, so a preempted run never leaves a half written checkpoint.
+    The agent's observation type is recorded too, load() refuses a checkpoint of the
+    other type.
+    '''
+
+    def __init__(self, folder=CHECKPOINT_FOLDER, keep=KEEP):
+        self.folder = folder
+        self.keep = keep
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        paths = self._paths()
+        self.version = self._version(paths[-1]) if paths else 0
+        self._thread = None
+
+    # checkpoint files, oldest first
+    def _paths(self):
+        return sorted(glob.glob(os.path.join(self.folder, 'checkpoint_*.pth')))
+
+    def _version(self, path):
+        return int(os.path.basename(path)[len('checkpoint_'):-len('.pth')])
+
+    def latest(self):
+        paths = self._paths()
+        return paths[-1] if paths else None
+
+    # snapshot the agent and write it in the background
+    # counters: extra values of the training loop (record, total score...) to resume with
+    def save(self, agent, replay=False, **counters):
+        trainer = agent.trainer
+        state = {
+            'model': copy.deepcopy(agent.model.state_dict()),
+            'optimizer': copy.deepcopy(trainer.optimizer.state_dict()),
+            'n_steps': trainer.n_steps,
+            'n_games': agent.n_games,
+            'epsilon': agent.epsilon,
+            'observation': agent.observation,
+            # plain python numbers, numpy scalars do not load with weights_only
+            'counters': {name: value.item() if hasattr(value, 'item') else value
+                         for name, value in counters.items()},
+        }
+        if trainer.target_update:
+            state['target_model'] = copy.deepcopy(trainer.target_model.state_dict())
+        if replay:
+            state['replay'] = agent.memory.state_dict()
+
+        # one write in flight at a time
+        self.wait()
+        self.version += 1
+        self._thread = threading.Thread(target=self._write, args=(state, self.version))
+        self._thread.start()
+
+    def _write(self, state, version):
+        path = os.path.join(self.folder, f'checkpoint_{version:06d}.pth')
+        tmp_path = path + '.tmp'
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+
+        # drop old versions
+        for old in self._paths()[:-self.keep]:
+            os.remove(old)
+
+    # block until the last save is on disk
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # restore the agent from a checkpoint (the latest by default)
+    # returns the saved counters, or None if there is no checkpoint
+    def load(self, agent, path=None):
+        path = path or self.latest()
+        if path is None:
+            return None
+        state = torch.load(path)
+        # checkpoints from before observations were recorded are all feature runs
+        observation = state.get('observation', 'features')
+        if observation != agent.observation:
+            raise ValueError(f'{path} was saved by a {observation!r} agent, '
+                             f'cannot resume a {agent.observation!r} agent from it')
+
+        trainer = agent.trainer
+        agent.model.load_state_dict(state['model'])
+        trainer.optimizer.load_state_dict(state['optimizer'])
+        trainer.n_steps = state['n_steps']
+        if trainer.target_update:
+            trainer.target_model.load_state_dict(state.get('target_model', state['model']))
+        agent.n_games = state['n_games']
+        agent.epsilon = state['epsilon']
+        if 'replay' in state:
+            agent.memory.load_state_dict(state['replay'])
+
+        return state['counters']
+
+    # resume from the latest checkpoint, or start from the fallback weights file if
+    # there is no checkpoint but the file exists
+    # returns the saved counters, or None if there is no checkpoint
+    def resume(self, agent, fallback=None):
+        counters = self.load(agent)
+        if counters is not None:
+            print(f'Resumed from {self.latest()} at game {agent.n_games}')
+        elif fallback is not None and os.path.exists(fallback):
+            agent.model.load(fallback)
+        return counters
@@ -0,0 +1,233 @@
+import numpy as np
+import multiprocessing as mp
+from snake_game import SnakeGameAI
+from state import encode_state, encode_grid, STATE_SIZE, GRID_CHANNELS
+
+# action index -> one-hot move of SnakeGameAI.play_step ([straight, left, right])
+MOVES = [[1,0,0],[0,1,0],[0,0,1]]
+
+
+class Discrete:
+    '''
+    Action spec: an integer in [0, n).
+    '''
+
+    def __init__(self, n, seed=None):
+        self.n = n
+        self.shape = ()
+        self.dtype = np.dtype(np.int64)
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self):
+        return int(self.rng.integers(self.n))
+
+    def contains(self, x):
+        return 0 <= int(x) < self.n
+
+    def __repr__(self):
+        return f'Discrete({self.n})'
+
+
+class Box:
+    '''
+    Observation spec: an array of the given shape and dtype with values in [low, high].
+    '''
+
+    def __init__(self, low, high, shape, dtype=np.float32, seed=None):
+        self.low = low
+        self.high = high
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self):
+        if self.dtype.kind in 'iub':
+            return self.rng.integers(self.low, self.high, self.shape, endpoint=True).astype(self.dtype)
+        return self.rng.uniform(self.low, self.high, self.shape).astype(self.dtype)
+
+    def contains(self, x):
+        x = np.asarray(x)
+        return x.shape == self.shape and bool(np.all((x >= self.low) & (x <= self.high)))
+
+    def __repr__(self):
+        return f'Box({self.low}, {self.high}, {self.shape}, {self.dtype})'
+
+
+class SnakeEnv:
+    '''
+    Gym-style wrapper of SnakeGameAI:
+
+        obs = env.reset(seed=0)
+        obs, reward, done, info = env.step(env.action_space.sample())
+
+    Actions are indices into [straight, left, right], observations the 11 features
+    (observation='features') or the full board (observation='grid') as uint8 arrays.
+    info holds the score.
+    '''
+
+    def __init__(self, w=640, h=480, render=False, seed=None, observation='features'):
+        self.game = SnakeGameAI(w, h, render=render, seed=seed)
+        self.observation = observation
+        self.action_space = Discrete(len(MOVES), seed=seed)
+        if observation == 'grid':
+            self.observation_space = Box(0, 1, (GRID_CHANNELS, self.game.rows, self.game.cols), np.uint8)
+            self._encode = encode_grid
+        else:
+            self.observation_space = Box(0, 1, (STATE_SIZE,), np.uint8)
+            self._encode = encode_state
+
+    def _observe(self):
+        return self._encode(self.game, np.zeros(self.observation_space.shape, dtype=np.uint8))
+
+    def reset(self, seed=None):
+        self.game.reset(seed=seed)
+        return self._observe()
+
+    def step(self, action):
+        reward, done, score = self.game.play_step(MOVES[action])
+        return self._observe(), reward, done, {'score': score}
+
+    def close(self):
+        pass
+
+
+# stack per-env info dicts into one dict of arrays
+def _stack_infos(infos):
+    return {key: np.array([info[key] for info in infos]) for key in infos[0]}
+
+
+class SyncVectorEnv:
+    '''
+    Steps a list of environments one after the other in this process, with the same
+    interface as AsyncVectorEnv. env_fns are callables building the environments.
+    Finished environments are reset inside step(), so the returned observation of a
+    done environment is the first one of its next episode.
+    '''
+
+    def __init__(self, env_fns):
+        self.envs = [fn() for fn in env_fns]
+        self.n_envs = len(self.envs)
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.observations = np.zeros((self.n_envs, *self.observation_space.shape),
+                                     dtype=self.observation_space.dtype)
+
+    # seed: environment i is reset with seed + i
+    def reset(self, seed=None):
+        for i, env in enumerate(self.envs):
+            self.observations[i] = env.reset(seed=None if seed is None else seed + i)
+        return self.observations.copy()
+
+    def step(self, actions):
+        rewards = np.zeros(self.n_envs)
+        dones = np.zeros(self.n_envs, dtype=bool)
+        infos = []
+        for i, env in enumerate(self.envs):
+            obs, rewards[i], dones[i], info = env.step(actions[i])
+            if dones[i]:
+                obs = env.reset()
+            self.observations[i] = obs
+            infos.append(info)
+        return self.observations.copy(), rewards, dones, _stack_infos(infos)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+# worker process of AsyncVectorEnv: owns one environment and writes its observations
+# straight into slot index of the shared observation array
+def _worker(env_fn, pipe, shared, shape, dtype, index):
+    env = env_fn()
+    observations = np.frombuffer(shared, dtype=dtype).reshape(shape)
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == 'step':
+                obs, reward, done, info = env.step(data)
+                if done:
+                    obs = env.reset()
+                observations[index] = obs
+                pipe.send((reward, done, info))
+            elif command == 'reset':
+                observations[index] = env.reset(seed=data)
+                pipe.send(None)
+            elif command == 'close':
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        env.close()
+        pipe.close()
+
+
+class AsyncVectorEnv:
+    '''
+    Steps environments in parallel, one worker process each. Observations are written
+    by the workers into one shared memory array, so only actions, rewards, dones and
+    infos go through the pipes. step() is step_async() followed by step_wait(); calling
+    them separately overlaps the environments with work in this process.
+
+    env_fns must be picklable (a class or a functools.partial of one) with the default
+    spawn start method. Finished environments are reset inside the workers.
+    '''
+
+    def __init__(self, env_fns, context='spawn'):
+        ctx = mp.get_context(context)
+        self.n_envs = len(env_fns)
+
+        # specs from a throwaway copy of the first environment
+        env = env_fns[0]()
+        self.observation_space = env.observation_space
+        self.action_space = env.action_space
+        env.close()
+
+        shape = (self.n_envs, *self.observation_space.shape)
+        dtype = self.observation_space.dtype
+        shared = ctx.RawArray('B', int(np.prod(shape)) * dtype.itemsize)
+        self.observations = np.frombuffer(shared, dtype=dtype).reshape(shape)
+
+        self.pipes = []
+        self.processes = []
+        for index, env_fn in enumerate(env_fns):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_worker, args=(env_fn, child, shared, shape, dtype, index), daemon=True)
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(process)
+        self.closed = False
+
+    # seed: environment i is reset with seed + i
+    def reset(self, seed=None):
+        for i, pipe in enumerate(self.pipes):
+            pipe.send(('reset', None if seed is None else seed + i))
+        for pipe in self.pipes:
+            pipe.recv()
+        return self.observations.copy()
+
+    def step_async(self, actions):
+        for pipe, action in zip(self.pipes, actions):
+            pipe.send(('step', int(action)))
+
+    def step_wait(self):
+        results = [pipe.recv() for pipe in self.pipes]
+        rewards = np.array([reward for reward, _, _ in results], dtype=np.float64)
+        dones = np.array([done for _, done, _ in results], dtype=bool)
+        infos = _stack_infos([info for _, _, info in results])
+        return self.observations.copy(), rewards, dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        for pipe in self.pipes:
+            pipe.send(('close', None))
+        for process in self.processes:
+            process.join()
+        for pipe in self.pipes:
+            pipe.close()
+        self.closed = True
@@ -0,0 +1,116 @@
+import torch
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import time
+import os
+from snake_game import SnakeGameAI
+from model import Linear_QNEt, QPolicy
+from state import encode_state, STATE_SIZE
+
+# parameters for evaluation
+EPISODES = 1000
+BATCH = 64 # games a worker plays side by side, sharing one forward pass per step
+MOVES = [[1,0,0],[0,1,0],[0,0,1]]
+
+
+# weights from a model.pth state dict or a training checkpoint
+def load_weights(path):
+    state = torch.load(path)
+    if 'model' in state:
+        state = state['model']
+    model = Linear_QNEt(11,256,3)
+    model.load_state_dict(state)
+    return model
+
+
+# worker: plays one greedy headless game per seed, batch at a time, and returns
+# the scores in seed order. script=True compiles the model with TorchScript
+def play_episodes(path,seeds,batch=BATCH,script=False):
+    torch.set_num_threads(1)
+    policy = QPolicy(load_weights(path),STATE_SIZE,max_batch=batch,script=script)
+
+    scores = [0]*len(seeds)
+    steps = 0
+    started = min(batch,len(seeds))
+    games = [SnakeGameAI(render=False,seed=seeds[i]) for i in range(started)]
+    episode = list(range(started))
+    states = np.zeros((len(games),STATE_SIZE),dtype=np.uint8)
+
+    while games:
+        for i, game in enumerate(games):
+            encode_state(game,out=states[i])
+        moves = policy.act_batch(states[:len(games)])
+
+        # step every game, replacing finished ones while episodes are left
+        finished = []
+        for i, game in enumerate(games):
+            _, done, score = game.play_step(MOVES[moves[i]])
+            steps += 1
+            if done:
+                scores[episode[i]] = score
+                if started < len(seeds):
+                    game.reset(seed=seeds[started])
+                    episode[i] = started
+                    started += 1
+                else:
+                    finished.append(i)
+        for i in reversed(finished):
+            games.pop(i)
+            episode.pop(i)
+
+    return scores, steps
+
+
+# play episodes games with the model at path over a pool of worker processes
+def evaluate(path,episodes=EPISODES,workers=None,batch=BATCH,seed=0,script=False):
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers,episodes)
+
+    # episode i plays the game seeded with seed + i, whichever worker runs it,
+    # so results do not depend on the number of workers
+    seeds = [seed + i for i in range(episodes)]
+    chunks = [seeds[i::workers] for i in range(workers)]
+    start = time.time()
+    with ProcessPoolExecutor(workers,mp_context=mp.get_context('spawn')) as pool:
+        results = list(pool.map(play_episodes,[path]*workers,chunks,[batch]*workers,[script]*workers))
+    elapsed = time.time() - start
+
+    scores = np.array([score for chunk_scores, _ in results for score in chunk_scores])
+    steps = sum(chunk_steps for _, chunk_steps in results)
+    return {'model': path,
+            'episodes': len(scores),
+            'seed': seed,
+            'mean': float(scores.mean()),
+            'std': float(scores.std()),
+            'min': int(scores.min()),
+            'p10': float(np.percentile(scores,10)),
+            'p50': float(np.percentile(scores,50)),
+            'p90': float(np.percentile(scores,90)),
+            'max': int(scores.max()),
+            'histogram': np.bincount(scores).tolist(),
+            'steps': steps,
+            'steps_per_sec': steps / elapsed,
+            'seconds': elapsed}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate trained snake models on seeded headless games')
+    parser.add_argument('models', nargs='*', default=['./model/model.pth'], help='model.pth files or checkpoints to compare')
+    parser.add_argument('--episodes', type=int, default=EPISODES)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--batch', type=int, default=BATCH, help='games per worker sharing one forward pass')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--script', action='store_true', help='compile the models with TorchScript')
+    parser.add_argument('--json', action='store_true', help='print the full reports as JSON')
+    args = parser.parse_args()
+
+    reports = [evaluate(path,args.episodes,args.workers,args.batch,args.seed,args.script) for path in args.models]
+    if args.json:
+        print(json.dumps(reports,indent=2))
+    else:
+        for r in reports:
+            print(f"{r['model']}: mean {r['mean']:.2f} +- {r['std']:.2f}  p10/p50/p90 {r['p10']:.0f}/{r['p50']:.0f}/{r['p90']:.0f}  "
+                  f"max {r['max']}  ({r['episodes']} games, {r['steps_per_sec']:.0f} steps/s)")
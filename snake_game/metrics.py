@@ -0,0 +1,105 @@
+import numpy as np
+import threading
+import os
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# parameters for the metrics sink
+PLOT_FOLDER = './plots'
+PLOT_INTERVAL = 30.0 # seconds between background renders
+CAPACITY = 100_000 # games kept in memory for the plot
+
+
+class MetricsSink:
+    '''
+    Collects the score of every finished game without ever plotting on the training
+    thread. log() is O(1): it writes into in-memory ring buffers and appends a line to
+    scores.csv. Plots are rendered headless (Agg) to training.png by a background thread
+    every interval seconds when new games came in, or only when render() is called if
+    interval is None. start is the number of games already played by a resumed run,
+    game numbers in the plot and the csv carry on from it.
+    '''
+
+    def __init__(self, folder=PLOT_FOLDER, interval=PLOT_INTERVAL, capacity=CAPACITY, start=0):
+        self.folder = folder
+        self.interval = interval
+        self.capacity = capacity
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        # ring buffers of the most recent games
+        self.scores = np.zeros(capacity, dtype=np.float64)
+        self.mean_scores = np.zeros(capacity, dtype=np.float64)
+        self.start = start
+        self.n_games = start
+        self.record = 0
+        self._rendered = start
+        self._lock = threading.Lock()
+
+        # full history on disk
+        self._csv = open(os.path.join(self.folder, 'scores.csv'), 'a')
+
+        self._stop = threading.Event()
+        self._thread = None
+        if self.interval is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    # store one finished game
+    def log(self, score, mean_score, record):
+        with self._lock:
+            i = self.n_games % self.capacity
+            self.scores[i] = score
+            self.mean_scores[i] = mean_score
+            self.n_games += 1
+            self.record = record
+        self._csv.write(f'{self.n_games},{score},{mean_score},{record}\n')
+
+    # render the plot now, on the calling thread
+    def render(self):
+        with self._lock:
+            n = self.n_games
+            if n == self.start:
+                return
+            # unroll the rings into game order
+            count = min(n - self.start, self.capacity)
+            order = (np.arange(n - count, n)) % self.capacity
+            scores = self.scores[order]
+            mean_scores = self.mean_scores[order]
+            record = self.record
+        self._csv.flush()
+
+        games = np.arange(n - count + 1, n + 1)
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.set_title('Training...')
+        ax.set_xlabel('Number of Games')
+        ax.set_ylabel('Score')
+        ax.plot(games, scores, label='game score')
+        ax.plot(games, mean_scores, label='mean score')
+        ax.legend()
+        ax.set_ylim(ymin=0)
+        ax.text(games[-1], scores[-1], str(scores[-1]))
+        ax.text(games[-1], mean_scores[-1], str(mean_scores[-1]))
+        ax.text(0.02, 0.9, f'Record: {record}', transform=ax.transAxes, fontsize=12, bbox=dict(facecolor='yellow', alpha=0.5))
+
+        # write next to the old plot and swap, so readers never see a half written file
+        file_name = os.path.join(self.folder, 'training.png')
+        tmp_name = file_name + '.tmp'
+        fig.savefig(tmp_name, format='png')
+        os.replace(tmp_name, file_name)
+        self._rendered = n
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.n_games != self._rendered:
+                self.render()
+
+    # stop the background thread and write a final plot
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.render()
+        self._csv.close()
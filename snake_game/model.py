@@ -2,10 +2,27 @@ import torch
 import torch.nn as nn 
 import torch.optim as optim 
 import torch.nn.functional as F
+import numpy as np
+import copy
 import os 
 
+# base class for the q networks: saving and loading weights
+class QNet(nn.Module):
+    def save(self,file_name='model.pth',model_folder_path='./model'):
+        if not os.path.exists(model_folder_path):
+            os.makedirs(model_folder_path)
+
+        file_name = os.path.join(model_folder_path,file_name)
+
+        torch.save(self.state_dict(),file_name)
+    
+    def load(self, file_path):
+        # Load the model's state dictionary from the .pth file
+        self.load_state_dict(torch.load(file_path))
+        # self.eval()
+    
 # class for the linear nn model
-class Linear_QNEt(nn.Module):
+class Linear_QNEt(QNet):
     def __init__(self, input_size, hidden_size, output_size):
         super().__init__()
 
@@ -22,72 +39,142 @@ class Linear_QNEt(nn.Module):
         # last layer with output raw values
         x = self.linear3(x)
 
-        return x 
-    
-    def save(self,file_name='model.pth'):
-        model_folder_path = './model'
+        return x
 
-        if not os.path.exists(model_folder_path):
-            os.makedirs(model_folder_path)
+# class for the convolutional nn model, takes full board observations (channels, rows, cols)
+class Conv_QNEt(QNet):
+    def __init__(self, in_channels, rows, cols, output_size, hidden_size=256):
+        super().__init__()
 
-        file_name = os.path.join(model_folder_path,file_name)
+        # two strided convolutions shrink the board 4x before the dense layers
+        self.conv1 = nn.Conv2d(in_channels,32,kernel_size=3,padding=1)
+        self.conv2 = nn.Conv2d(32,64,kernel_size=3,stride=2,padding=1)
+        self.conv3 = nn.Conv2d(64,64,kernel_size=3,stride=2,padding=1)
+        conv_rows = (((rows + 1)//2) + 1)//2
+        conv_cols = (((cols + 1)//2) + 1)//2
+        self.linear1 = nn.Linear(64*conv_rows*conv_cols,hidden_size)
+        self.linear2 = nn.Linear(hidden_size,output_size)
+
+    # feed forward function, a single board (channels, rows, cols) or a batch of them
+    def forward(self,x):
+        single = x.dim() == 3
+        if single:
+            x = torch.unsqueeze(x,0)
+
+        x = F.relu(self.conv1(x))
+        x = F.relu(self.conv2(x))
+        x = F.relu(self.conv3(x))
+        x = F.relu(self.linear1(torch.flatten(x,1)))
+        x = self.linear2(x)
+
+        if single:
+            x = torch.squeeze(x,0)
+        return x
+
+# fast action selection with a q network: no autograd, one reused input buffer,
+# optionally compiled with TorchScript. shares weights with the model it wraps so
+# training updates are picked up without copying
+# input_shape: size of a feature state or shape of a board observation
+class QPolicy:
+    def __init__(self,model,input_shape,max_batch=1,script=False):
+        self.model = model
+        self.net = torch.jit.script(model) if script else model
+
+        # input buffer, pinned when there is a gpu to copy to
+        self.input_shape = (input_shape,) if isinstance(input_shape,int) else tuple(input_shape)
+        self.buffer = torch.zeros((max_batch,*self.input_shape),dtype=torch.float,pin_memory=torch.cuda.is_available())
+
+    # index of the best action for one state
+    def act(self,state):
+        with torch.inference_mode():
+            self.buffer[0].copy_(torch.from_numpy(np.asarray(state)))
+            return int(torch.argmax(self.net(self.buffer[:1])))
+
+    # index of the best action for every row of states, in one forward pass
+    def act_batch(self,states):
+        states = torch.from_numpy(np.asarray(states))
+        n = len(states)
+        if n > len(self.buffer):
+            self.buffer = torch.zeros((n,*self.input_shape),dtype=torch.float,pin_memory=torch.cuda.is_available())
+
+        with torch.inference_mode():
+            self.buffer[:n].copy_(states)
+            return torch.argmax(self.net(self.buffer[:n]),dim=1).numpy()
 
-        torch.save(self.state_dict(),file_name)
-    
-    def load(self, file_path):
-        # Load the model's state dictionary from the .pth file
-        self.load_state_dict(torch.load(file_path))
-        # self.eval()
-    
 # backpropagation with MSE loss
 class QTrainer:
-    def __init__(self,model,lr,gamma):
+    # target_update > 0 computes the bellman targets with a frozen copy of the model
+    # that is refreshed every target_update train steps, 0 uses the model itself
+    def __init__(self,model,lr,gamma,target_update=0):
         self.lr = lr
         self.gamma = gamma
         self.model = model 
 
+        # target network
+        self.target_update = target_update
+        self.n_steps = 0
+        if self.target_update:
+            self.target_model = copy.deepcopy(model)
+            self.target_model.requires_grad_(False)
+        else:
+            self.target_model = model
+
         # optimizer
         self.optimizer = optim.Adam(model.parameters(),lr=self.lr)
 
         # loss function --> MSE
         self.criterion = nn.MSELoss()
 
-    def train_step(self,state,action,reward,next_state,done):
-        # convert inputs to tensors 
-        state = torch.tensor(state,dtype=torch.float)
-        next_state = torch.tensor(next_state, dtype=torch.float)
-        action = torch.tensor(action, dtype=torch.long)
-        reward = torch.tensor(reward,dtype=torch.float)
+    # one update on a single memory or a whole batch, all samples in one forward pass
+    # weights: optional importance-sampling weight per sample (prioritized replay)
+    # returns the TD error of every sample
+    def train_step(self,state,action,reward,next_state,done,weights=None):
+        # convert inputs to tensors (stack tuples of arrays first, torch is slow on those)
+        state = torch.as_tensor(np.asarray(state),dtype=torch.float)
+        next_state = torch.as_tensor(np.asarray(next_state), dtype=torch.float)
+        action = torch.as_tensor(np.asarray(action), dtype=torch.long)
+        reward = torch.as_tensor(np.asarray(reward),dtype=torch.float)
+        done = torch.as_tensor(np.asarray(done),dtype=torch.bool)
 
         # handle multiple memories 
-        if len(state.shape) == 1: # only have one memory 
+        if done.dim() == 0: # only have one memory 
             # reshape tensors (1,x)
             state = torch.unsqueeze(state,0)
             next_state = torch.unsqueeze(next_state,0)
             action = torch.unsqueeze(action,0)
             reward = torch.unsqueeze(reward,0)
-            done = (done,) # convert single value to tuple 
+            done = torch.unsqueeze(done,0)
         
         # 1: prediction with three raw values 
         pred = self.model(state)
 
-        target = pred.clone()
-
-        for idx in range(len(done)):
-            Q_new = reward[idx]
+        # 2: get new Q as r + y * max(next_predicted Q), only r for finished games
+        with torch.no_grad():
+            next_q = self.target_model(next_state).max(dim=1)[0]
+        Q_new = reward + self.gamma * next_q * ~done
 
-            if not done[idx]:
-                Q_new = reward[idx] + self.gamma * torch.max(self.model(next_state[idx]))
+        # replace the Q value of the action taken in every row
+        rows = torch.arange(len(done))
+        taken = torch.argmax(action,dim=1)
+        target = pred.detach().clone()
+        target[rows,taken] = Q_new
 
-            target[idx][torch.argmax(action).item()] = Q_new
-
-
-        # 2: get new Q as r + y * max(next_predicted Q)
         self.optimizer.zero_grad()
-        loss = self.criterion(target,pred)
+        if weights is None:
+            loss = self.criterion(target,pred)
+        else:
+            # same MSE, with every sample scaled by its weight
+            loss = (torch.as_tensor(weights) * ((target - pred)**2).mean(dim=1)).mean()
         loss.backward()
 
         self.optimizer.step()
 
+        # refresh the frozen target network
+        self.n_steps += 1
+        if self.target_update and self.n_steps % self.target_update == 0:
+            self.target_model.load_state_dict(self.model.state_dict())
+
+        return (Q_new - pred[rows,taken]).detach()
+
 
 
@@ -0,0 +1,137 @@
+import cProfile
+import pstats
+import time
+import os
+from collections import deque
+from contextlib import nullcontext
+
+# parameters for profiling
+PROFILE_FOLDER = './profiles'
+WINDOW = 100 # games kept for the rolling aggregates
+
+# shared do-nothing phase handed out when timing is disabled
+NULL_PHASE = nullcontext()
+
+
+class _Phase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        times, counts = self.timer._times, self.timer._counts
+        times[self.name] = times.get(self.name, 0.0) + time.perf_counter() - self.start
+        counts[self.name] = counts.get(self.name, 0) + 1
+
+
+class PhaseTimer:
+    '''
+    Per-phase wall time for the training loop:
+
+        with timer.phase('env'):
+            game.play_step(move)
+        ...
+        timer.end_game()
+
+    Disabled timers hand out one shared null context, so instrumented code costs a
+    method call per phase. Enabled timers sum time and calls per phase for the current
+    game and keep the last window games for rolling aggregates. A cProfile or torch
+    profiler trace can be recorded for profile_games games starting at profile_start,
+    written to ./profiles.
+    '''
+
+    def __init__(self, enabled=False, window=WINDOW, trace=None, profile_start=10, profile_games=0,
+                 folder=PROFILE_FOLDER):
+        self.enabled = enabled
+        self.games = deque(maxlen=window)
+        self._times = {}
+        self._counts = {}
+        self._phases = {}
+        self._game_start = time.perf_counter()
+        self.n_games = 0
+
+        # optional trace window: 'cprofile' or 'torch'
+        self.trace = trace if profile_games else None
+        self.profile_start = profile_start
+        self.profile_end = profile_start + profile_games
+        self.folder = folder
+        self._profiler = None
+        if self.trace and self.profile_start == 0:
+            self._start_trace()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase(self, name)
+        return phase
+
+    # close the current game's timings and move the trace window along
+    def end_game(self):
+        self.n_games += 1
+        if self.enabled:
+            now = time.perf_counter()
+            self.games.append({'total': now - self._game_start,
+                               'times': self._times,
+                               'counts': self._counts})
+            self._times = {}
+            self._counts = {}
+            self._game_start = now
+
+        if self.trace:
+            if self.n_games == self.profile_start:
+                self._start_trace()
+            elif self.n_games == self.profile_end:
+                self._stop_trace()
+
+    # rolling aggregates over the last window games:
+    # per phase total seconds, seconds and calls per game, and share of the wall time
+    def summary(self):
+        wall = sum(game['total'] for game in self.games)
+        n = max(len(self.games), 1)
+        totals, counts = {}, {}
+        for game in self.games:
+            for name, seconds in game['times'].items():
+                totals[name] = totals.get(name, 0.0) + seconds
+                counts[name] = counts.get(name, 0) + game['counts'][name]
+        return {name: {'seconds': seconds,
+                       'seconds_per_game': seconds / n,
+                       'calls_per_game': counts[name] / n,
+                       'share': seconds / wall if wall else 0.0}
+                for name, seconds in sorted(totals.items(), key=lambda item: -item[1])}
+
+    # one line report of the rolling aggregates
+    def report(self):
+        parts = [f'{name} {stats["share"]*100:.0f}% ({stats["seconds_per_game"]*1000:.1f}ms/game)'
+                 for name, stats in self.summary().items()]
+        return f'Phases over last {len(self.games)} games: ' + ', '.join(parts)
+
+    def _start_trace(self):
+        if self.trace == 'torch':
+            import torch
+            self._profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+            self._profiler.__enter__()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _stop_trace(self):
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        if self.trace == 'torch':
+            self._profiler.__exit__(None, None, None)
+            file_name = os.path.join(self.folder, 'trace.json')
+            self._profiler.export_chrome_trace(file_name)
+        else:
+            self._profiler.disable()
+            file_name = os.path.join(self.folder, 'train.prof')
+            self._profiler.dump_stats(file_name)
+            pstats.Stats(self._profiler).sort_stats('cumulative').print_stats(20)
+        print(f'Wrote {self.trace} trace of games {self.profile_start}-{self.profile_end} to {file_name}')
+        self._profiler = None
+        self.trace = None
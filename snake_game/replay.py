@@ -0,0 +1,200 @@
+import numpy as np
+import torch
+
+
+class ReplayBuffer:
+    '''
+    Replay memory for the agent. Transitions live in preallocated contiguous arrays
+    (uint8 states, int8 one-hot actions, float32 rewards, bool dones) used as a ring
+    buffer, so once full the oldest memories get overwritten like a deque with maxlen.
+    Samples come back as tensors that share memory with the gathered arrays.
+    '''
+
+    def __init__(self, capacity, state_shape, n_actions=3, state_dtype=np.uint8, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, *state_shape), dtype=state_dtype)
+        self.next_states = np.zeros((capacity, *state_shape), dtype=state_dtype)
+        self.actions = np.zeros((capacity, n_actions), dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+
+        # next slot to write and number of stored memories
+        self.pos = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    # add one transition, overwriting the oldest one if full
+    def push(self, state, action, reward, next_state, done):
+        i = self.pos
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    # add a batch of transitions (one per row) in one go
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        n = len(rewards)
+        idx = (self.pos + np.arange(n)) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = dones
+
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    # batch_size random memories without replacement, or all of them if there are fewer
+    def sample(self, batch_size):
+        if self.size > batch_size:
+            idx = self.rng.choice(self.size, batch_size, replace=False)
+        else:
+            idx = np.arange(self.size)
+        return self._gather(idx)
+
+    # states, actions, rewards, next_states, dones at idx as tensors
+    def _gather(self, idx):
+        return (torch.from_numpy(self.states[idx]),
+                torch.from_numpy(self.actions[idx]),
+                torch.from_numpy(self.rewards[idx]),
+                torch.from_numpy(self.next_states[idx]),
+                torch.from_numpy(self.dones[idx]))
+
+    # copy of the stored memories as tensors, for checkpoints
+    def state_dict(self):
+        n = self.size
+        return {'states': torch.from_numpy(self.states[:n].copy()),
+                'actions': torch.from_numpy(self.actions[:n].copy()),
+                'rewards': torch.from_numpy(self.rewards[:n].copy()),
+                'next_states': torch.from_numpy(self.next_states[:n].copy()),
+                'dones': torch.from_numpy(self.dones[:n].copy()),
+                'pos': self.pos,
+                'size': self.size}
+
+    def load_state_dict(self, state):
+        n = state['size']
+        self.states[:n] = state['states'].numpy()
+        self.actions[:n] = state['actions'].numpy()
+        self.rewards[:n] = state['rewards'].numpy()
+        self.next_states[:n] = state['next_states'].numpy()
+        self.dones[:n] = state['dones'].numpy()
+        self.pos = state['pos'] % self.capacity
+        self.size = n
+
+
+class SumTree:
+    '''
+    Binary tree where every node holds the sum of its children, with one leaf per slot
+    of the replay memory. Sampling and priority updates walk one root to leaf path,
+    O(log n), and are done for a whole batch at once level by level.
+    '''
+
+    def __init__(self, capacity):
+        # leaves live at [n_leaves, 2*n_leaves), root at 1
+        self.n_leaves = 1
+        while self.n_leaves < capacity:
+            self.n_leaves *= 2
+        self.depth = self.n_leaves.bit_length() - 1
+        self.tree = np.zeros(2*self.n_leaves, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    # priorities of the leaves at idx
+    def get(self, idx):
+        return self.tree[idx + self.n_leaves]
+
+    # set the priorities of the leaves at idx and recompute their ancestors
+    def update(self, idx, priorities):
+        nodes = np.asarray(idx) + self.n_leaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2*nodes] + self.tree[2*nodes + 1]
+
+    # leaf index for every value in [0, total), found by walking down the tree
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2*nodes
+            go_right = values >= self.tree[left]
+            values -= self.tree[left] * go_right
+            nodes = left + go_right
+        return nodes - self.n_leaves
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    '''
+    Replay memory that samples transitions proportionally to priority**alpha, where the
+    priority is the last absolute TD error seen for that transition. New transitions get
+    the highest priority so far so they are replayed soon after being stored. Samples come
+    with importance-sampling weights (annealed from beta up to 1) that correct the bias
+    of the non-uniform sampling in the loss.
+    '''
+
+    def __init__(self, capacity, state_shape, n_actions=3, state_dtype=np.uint8, seed=None,
+                 alpha=0.6, beta=0.4, beta_increment=1e-4, eps=1e-5):
+        super().__init__(capacity, state_shape, n_actions, state_dtype, seed)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.eps = eps
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def push(self, state, action, reward, next_state, done):
+        i = self.pos
+        super().push(state, action, reward, next_state, done)
+        self.tree.update([i], self.max_priority ** self.alpha)
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        idx = (self.pos + np.arange(len(rewards))) % self.capacity
+        super().push_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(idx, self.max_priority ** self.alpha)
+
+    # batch_size memories drawn by priority (one from each equal slice of the total),
+    # returned with their importance-sampling weights and indices for update_priorities
+    def sample(self, batch_size):
+        total = self.tree.total()
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        idx = np.minimum(self.tree.find(np.minimum(values, np.nextafter(total, 0))), self.size - 1)
+
+        # importance-sampling weights, normalised so the largest is 1
+        probs = self.tree.get(idx) / total
+        weights = (self.size * probs) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        return self._gather(idx) + (torch.from_numpy(weights.astype(np.float32)), idx)
+
+    def state_dict(self):
+        state = super().state_dict()
+        state['priorities'] = torch.from_numpy(self.tree.get(np.arange(self.size)).copy())
+        state['max_priority'] = self.max_priority
+        state['beta'] = self.beta
+        return state
+
+    # a state from a uniform ReplayBuffer has no priorities, its transitions get the
+    # max priority like fresh pushes
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        if 'priorities' not in state:
+            self.tree.update(np.arange(self.size), self.max_priority ** self.alpha)
+            return
+        self.tree.update(np.arange(self.size), state['priorities'].numpy())
+        self.max_priority = state['max_priority']
+        self.beta = state['beta']
+
+    # new priorities from the TD errors of the transitions at idx
+    def update_priorities(self, idx, td_errors):
+        priorities = np.abs(td_errors) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(idx, priorities ** self.alpha)
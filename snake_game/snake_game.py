@@ -1,12 +1,11 @@
 import pygame
-import random
 from enum import Enum
 from collections import namedtuple
 import numpy as np
+import os
 
-pygame.init()
-font = pygame.font.Font('arial.ttf', 25)
-#font = pygame.font.SysFont('arial', 25)
+# font is only loaded when the game is rendered
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'arial.ttf')
 
 # reset function --> after each game agent should be able to reset and restart
 # reward function for agent
@@ -23,6 +22,10 @@ class Direction(Enum):
 Point = namedtuple('Point', 'x, y')
 Bomb_Point = namedtuple('Point', 'x,y,direction')
 
+# everything needed to put a game back to an earlier step, see SnakeGameAI.snapshot
+GameSnapshot = namedtuple('GameSnapshot', 'snake, head, direction, food, bombs, bomb_velocity, score, '
+                                          'length, frame_iteration, counter, grid, free, rng_state')
+
 # rgb colors
 WHITE = (255, 255, 255)
 GREEN = (0,200,0)
@@ -34,16 +37,39 @@ BLACK = (0,0,0)
 BLOCK_SIZE = 20
 SPEED = 200
 
+# layers of the occupancy grid, each cell holds a count of objects on it
+BODY = 0
+BOMB = 1
+FOOD = 2
+
+# bomb (row, col) velocities by name, new bombs alternate between right and down
+BOMB_DIRECTIONS = {(0, 1): 'RIGHT', (0, -1): 'LEFT', (-1, 0): 'UP', (1, 0): 'DOWN'}
+BOMB_START = np.array([[0, 1], [1, 0]])
+
 class SnakeGameAI:
     
     # initialize the snake and the game 
-    def __init__(self, w=640, h=480):
+    # render=False runs headless: no display, font or clock, steps as fast as the cpu allows
+    # seed: seed of the game's own random generator (food and bomb placement)
+    def __init__(self, w=640, h=480, render=True, seed=None):
         self.w = w
         self.h = h
+        self.render = render
+        self.rng = np.random.default_rng(seed)
+
+        # occupancy grid of the board, one layer each for body, bombs and food
+        self.rows = self.h // BLOCK_SIZE
+        self.cols = self.w // BLOCK_SIZE
+        self.grid = np.zeros((3, self.rows, self.cols), dtype=np.int16)
+        self._index_free()
+
         # init display
-        self.display = pygame.display.set_mode((self.w, self.h))
-        pygame.display.set_caption('Snake')
-        self.clock = pygame.time.Clock()
+        if self.render:
+            pygame.init()
+            self.display = pygame.display.set_mode((self.w, self.h))
+            pygame.display.set_caption('Snake')
+            self.clock = pygame.time.Clock()
+            self.font = pygame.font.Font(FONT_PATH, 25)
 
         # init game state
         self.direction = Direction.RIGHT
@@ -54,14 +80,18 @@ class SnakeGameAI:
                       Point(self.head.x-BLOCK_SIZE, self.head.y),
                       Point(self.head.x-(2*BLOCK_SIZE), self.head.y)]
         self.length = len(self.snake)
+        for pt in self.snake:
+            self._add(BODY, pt)
         
         # initalize zero score and place down food
         self.score = 0
         self.food = None
 
-        # bomb stuff
-        self.bomb_list = []
-        self.moving_bombs = []
+        # bombs as (row, col) cells and velocities, one row per bomb, the first
+        # counter bombs move. there can be at most one bomb per cell
+        self.bombs = np.zeros((self.rows*self.cols, 2), dtype=np.int64)
+        self.bomb_velocity = np.zeros_like(self.bombs)
+        self.n_bombs = 0
         self.counter = 0
 
         self._place_food()
@@ -71,7 +101,11 @@ class SnakeGameAI:
         self.frame_iteration = 0
         
     # function to reset the game and let agent replay
-    def reset(self):
+    # a seed restarts the random generator, so a logged seed replays the same game
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
         # init game state
         self.direction = Direction.RIGHT
         
@@ -82,11 +116,17 @@ class SnakeGameAI:
                       Point(self.head.x-(2*BLOCK_SIZE), self.head.y)]
         
         self.length = len(self.snake)
+
+        # rebuild the occupancy grid
+        self.grid.fill(0)
+        self._index_free()
+        for pt in self.snake:
+            self._add(BODY, pt)
         
         # initalize zero score and place down food
         self.score = 0
         self.food = None
-        self.bomb_list = []
+        self.n_bombs = 0
         self._place_food()
         self._place_bomb()
         
@@ -95,71 +135,141 @@ class SnakeGameAI:
 
         self.counter = 0
 
+    # cheap copy of the game state: the snake is a list of immutable points so it is
+    # copied shallowly, the bombs, occupancy grid and free cells are small copies
+    def snapshot(self):
+        return GameSnapshot(tuple(self.snake), self.head, self.direction, self.food,
+                            self.bombs[:self.n_bombs].copy(), self.bomb_velocity[:self.n_bombs].copy(),
+                            self.score, self.length, self.frame_iteration, self.counter,
+                            self.grid.copy(), (tuple(self._free), tuple(self._free_pos)),
+                            self.rng.bit_generator.state)
+
+    # put the game back to a snapshot, random generator included
+    def restore(self, snapshot):
+        self.snake = list(snapshot.snake)
+        self.head = snapshot.head
+        self.direction = snapshot.direction
+        self.food = snapshot.food
+        self.n_bombs = len(snapshot.bombs)
+        self.bombs[:self.n_bombs] = snapshot.bombs
+        self.bomb_velocity[:self.n_bombs] = snapshot.bomb_velocity
+        self.score = snapshot.score
+        self.length = snapshot.length
+        self.frame_iteration = snapshot.frame_iteration
+        self.counter = snapshot.counter
+        np.copyto(self.grid, snapshot.grid)
+        self._free = list(snapshot.free[0])
+        self._free_pos = list(snapshot.free[1])
+        self.rng.bit_generator.state = snapshot.rng_state
+
+    # bombs as points with a direction name, for code that wants them one by one
+    @property
+    def bomb_list(self):
+        return [Bomb_Point(int(col)*BLOCK_SIZE, int(row)*BLOCK_SIZE, BOMB_DIRECTIONS[(int(dr), int(dc))])
+                for (row, col), (dr, dc) in zip(self.bombs[:self.n_bombs], self.bomb_velocity[:self.n_bombs])]
+
+    # grid cell (row, col) of a point on the board
+    def _cell(self, pt):
+        return int(pt.y) // BLOCK_SIZE, int(pt.x) // BLOCK_SIZE
+
+    # add/remove an object on the occupancy grid, keeping the free cells in sync
+    def _add(self, layer, pt):
+        row, col = self._cell(pt)
+        self.grid[layer, row, col] += 1
+        self._take(row*self.cols + col)
+
+    def _remove(self, layer, pt):
+        row, col = self._cell(pt)
+        self.grid[layer, row, col] -= 1
+        self._release(row*self.cols + col)
+
+    # free cells (no body, bomb or food) as a list of flat cell ids plus the index of
+    # every cell in it (-1 if occupied): drawing, taking and releasing a cell are O(1)
+    def _index_free(self):
+        self._free = np.flatnonzero(~self.grid.any(axis=0)).tolist()
+        self._free_pos = [-1]*(self.rows*self.cols)
+        for i, cell in enumerate(self._free):
+            self._free_pos[cell] = i
+
+    # a cell got an object: swap it with the last free cell and drop it
+    def _take(self, cell):
+        i = self._free_pos[cell]
+        if i >= 0:
+            last = self._free.pop()
+            if last != cell:
+                self._free[i] = last
+                self._free_pos[last] = i
+            self._free_pos[cell] = -1
+
+    # a cell lost an object: free it again if nothing is left on it
+    def _release(self, cell):
+        if self._free_pos[cell] < 0 and not self.grid[:, cell // self.cols, cell % self.cols].any():
+            self._free_pos[cell] = len(self._free)
+            self._free.append(cell)
+
+    # uniform random free cell as a point, None if the board is full
+    def _random_free_point(self):
+        if not self._free:
+            return None
+        cell = self._free[int(self.rng.integers(len(self._free)))]
+        return Point((cell % self.cols)*BLOCK_SIZE, (cell // self.cols)*BLOCK_SIZE)
+
     # function to place down food randomly    
+    # food goes on a free cell (not in the snake or on a bomb). on a full board the
+    # eaten food stays where it is, the game ends on the next move anyway
     def _place_food(self):
-        x = random.randint(0, (self.w-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE 
-        y = random.randint(0, (self.h-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE
-        self.food = Point(x, y)
-
-        # call again if the food was placed in the snake
-        if (self.food in self.snake) or (self.food in self.bomb_list): 
-            self._place_food()
+        food = self._random_free_point()
+        if food is None:
+            return
+        if self.food is not None:
+            self._remove(FOOD, self.food)
+        self.food = food
+        self._add(FOOD, food)
     
     # function to place a bomb 
+    # bombs go on a free cell, none is placed on a full board
     def _place_bomb(self):
-        # place coordinates of bomb 
-        x = random.randint(0, (self.w-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE 
-        y = random.randint(0, (self.h-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE
-
-        # give bomb default direction 
-        if len(self.bomb_list) % 2 == 0:
-            dir = 'RIGHT'
-        else:
-            dir = 'DOWN'
-
-        # craete bomb 
-        bomb = Bomb_Point(x, y, dir)
-    
-        # check if the bomb is in bad spot and recall bomb 
-        if bomb in self.bomb_list or bomb in self.snake or (bomb.x == self.food.x and bomb.y == self.food.y):
-            self._place_bomb()
+        bomb = self._random_free_point()
+        if bomb is None:
+            return
 
         # increment move counter if bomb list is full 
-        # elif len(self.bomb_list) == 10:
+        # if self.n_bombs == 10:
         #     if self.counter < 9: 
         #         self.counter += 1
-        else:
-            self.bomb_list.append(bomb)
+
+        # give bomb default direction (right, down, right...)
+        self.bombs[self.n_bombs] = self._cell(bomb)
+        self.bomb_velocity[self.n_bombs] = BOMB_START[self.n_bombs % 2]
+        self.n_bombs += 1
+        self._add(BOMB, bomb)
     
     # function to move bombs 
+    # all bombs below the counter take one step at once, a bomb that would leave the
+    # board (or enter the first row/column moving up/left) turns around instead
     def move_bomb(self):
-        # move all bombs that are below the counter 
-        for i in range(self.counter):
-                # grab bomb 
-                bomb = self.bomb_list[i]
-
-                # change bombs direction based on logic 
-                if bomb.direction == 'RIGHT':
-                    if bomb.x + BLOCK_SIZE < self.w:
-                        bomb = Bomb_Point(bomb.x + BLOCK_SIZE, bomb.y,bomb.direction)
-                    else:
-                        bomb = Bomb_Point(bomb.x - BLOCK_SIZE, bomb.y,'LEFT')
-                elif bomb.direction == 'LEFT':
-                    if bomb.x - BLOCK_SIZE > 0:
-                        bomb = Bomb_Point(bomb.x - BLOCK_SIZE, bomb.y,bomb.direction)
-                    else:
-                        bomb = Bomb_Point(bomb.x + BLOCK_SIZE, bomb.y,'RIGHT')
-                elif bomb.direction == 'UP':
-                    if bomb.y - BLOCK_SIZE > 0:
-                        bomb = Bomb_Point(bomb.x, bomb.y-BLOCK_SIZE,bomb.direction)
-                    else:
-                        bomb = Bomb_Point(bomb.x, bomb.y+BLOCK_SIZE,'DOWN')
-                else:
-                    if bomb.y + BLOCK_SIZE < self.h:
-                        bomb = Bomb_Point(bomb.x, bomb.y+BLOCK_SIZE,bomb.direction)
-                    else:
-                        bomb = Bomb_Point(bomb.x, bomb.y-BLOCK_SIZE,'UP')
-                self.bomb_list[i] = bomb
+        n = self.counter
+        if n == 0:
+            return
+        pos = self.bombs[:n]
+        vel = self.bomb_velocity[:n]
+
+        # bounce off the walls
+        new = pos + vel
+        bounce = ((vel > 0) & (new >= (self.rows, self.cols))) | ((vel < 0) & (new <= 0))
+        np.negative(vel, out=vel, where=bounce)
+        np.add(pos, vel, out=new, where=bounce)
+
+        # move them on the occupancy grid, then free the cells they left and take the
+        # ones they moved to
+        bomb_grid = self.grid[BOMB]
+        np.subtract.at(bomb_grid, (pos[:, 0], pos[:, 1]), 1)
+        np.add.at(bomb_grid, (new[:, 0], new[:, 1]), 1)
+        for cell in (pos[:, 0]*self.cols + pos[:, 1]).tolist():
+            self._release(cell)
+        for cell in (new[:, 0]*self.cols + new[:, 1]).tolist():
+            self._take(cell)
+        pos[:] = new
 
     
     # function to play a step of the game based on the action choosen by the agent 
@@ -167,17 +277,13 @@ class SnakeGameAI:
         # increment the frame iteration 
         self.frame_iteration += 1 
 
-        # 1. collect user input
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-        
-        # 2. move based on the agents action 
+        # 1. move based on the agents action 
         self._move(action) # update the head
         self.snake.insert(0, self.head)
+        if self._on_board(self.head):
+            self._add(BODY, self.head)
         
-        # 3. check if game over
+        # 2. check if game over
         game_over = False
         reward = -1*(self.frame_iteration/(len(self.snake)*10))
 
@@ -198,7 +304,7 @@ class SnakeGameAI:
             reward = -10
             return reward, game_over, self.score
             
-        # 4. place new food or just move
+        # 3. place new food or just move
         if self.head == self.food:
             self.score += 1
             reward = 10 
@@ -207,31 +313,45 @@ class SnakeGameAI:
             self.length += 1
         # move the snake by removing the last element in list 
         else:
-            self.snake.pop()
+            self._remove(BODY, self.snake.pop())
         
-        # 5. update ui and clock
-        self._update_ui()
-        self.clock.tick(SPEED)
+        # 4. move bombs (game logic, runs headless too)
+        self.move_bomb()
+
+        # 5. update ui (and collect user input) and clock
+        if self.render:
+            self._update_ui()
+            self.clock.tick(SPEED)
         # 6. return game over and score
         return reward, game_over, self.score
     
+    def _on_board(self, pt):
+        return not (pt.x >  self.w - BLOCK_SIZE or pt.x < 0 or pt.y > self.h - BLOCK_SIZE or pt.y < 0)
+
+    # constant time: looks up the occupancy grid instead of scanning the snake and bombs
     def is_collision(self, pt=None):
         if pt is None:
             pt = self.head
         # hits boundary
-        if pt.x >  self.w - BLOCK_SIZE or pt.x < 0 or pt.y > self.h - BLOCK_SIZE or pt.y < 0:
+        if not self._on_board(pt):
             return True
-        # hits itself
-        if pt in self.snake[1:]:
+        row, col = self._cell(pt)
+        # hits itself (the head's own cell does not count, same as checking snake[1:])
+        if self.grid[BODY, row, col] - (pt == self.snake[0]) > 0:
             return True
         # hits bomb
-        for bomb in self.bomb_list:
-            if pt.x == bomb.x and pt.y == bomb.y:
-                return True
+        if self.grid[BOMB, row, col]:
+            return True
         
         return False
         
     def _update_ui(self):
+        # the window can only be closed while it is drawn
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                quit()
+
         self.display.fill(BLACK)
         
         for pt in self.snake:
@@ -240,14 +360,11 @@ class SnakeGameAI:
             
         pygame.draw.rect(self.display, GREEN, pygame.Rect(self.food.x, self.food.y, BLOCK_SIZE, BLOCK_SIZE))
 
-        # move bombs
-        self.move_bomb()
-
         # draw bombs 
-        for bomb in self.bomb_list:
-            pygame.draw.rect(self.display, RED, pygame.Rect(bomb.x, bomb.y, BLOCK_SIZE, BLOCK_SIZE))
+        for row, col in self.bombs[:self.n_bombs]:
+            pygame.draw.rect(self.display, RED, pygame.Rect(col*BLOCK_SIZE, row*BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE))
 
-        text = font.render("Score: " + str(self.score), True, WHITE)
+        text = self.font.render("Score: " + str(self.score), True, WHITE)
         self.display.blit(text, [0, 0])
         pygame.display.flip()
     
@@ -0,0 +1,160 @@
+import numpy as np
+from snake_game import Direction, BLOCK_SIZE, BODY, BOMB, FOOD
+
+# state layout (11 features):
+# danger straight, danger right, danger left,
+# moving left, right, up, down,
+# food left, right, up, down
+STATE_SIZE = 11
+
+# directions in clockwise order as in SnakeGameAI._move, with their (row, col) step
+CLOCK_WISE = [Direction.RIGHT, Direction.DOWN, Direction.LEFT, Direction.UP]
+DIR_INDEX = {direction: i for i, direction in enumerate(CLOCK_WISE)}
+DIR_STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+DIR_STEPS_ARRAY = np.array(DIR_STEPS, dtype=np.int64)
+
+# direction features (left, right, up, down) for every clockwise direction index
+DIR_FEATURES = np.array([[0, 1, 0, 0], [0, 0, 0, 1], [1, 0, 0, 0], [0, 0, 1, 0]], dtype=np.uint8)
+
+
+# whether the cell at (row, col) ends the game (wall, body or bomb)
+def _blocked(game, row, col):
+    if row < 0 or row >= game.rows or col < 0 or col >= game.cols:
+        return True
+    return bool(game.grid[BODY, row, col] or game.grid[BOMB, row, col])
+
+
+def encode_state(game, out=None):
+    '''
+    Writes the 11 feature state of a SnakeGameAI into out (allocated if None) and
+    returns it. Danger checks are two occupancy grid lookups: "danger right" looks at
+    the counter clockwise neighbour and "danger left" repeats the straight check, as
+    the original Agent.get_state did.
+    '''
+    if out is None:
+        out = np.zeros(STATE_SIZE, dtype=int)
+
+    head = game.head
+    row, col = int(head.y) // BLOCK_SIZE, int(head.x) // BLOCK_SIZE
+    d = DIR_INDEX[game.direction]
+
+    # danger straight, right and left
+    step = DIR_STEPS[d]
+    out[0] = _blocked(game, row + step[0], col + step[1])
+    step = DIR_STEPS[(d - 1) % 4]
+    out[1] = _blocked(game, row + step[0], col + step[1])
+    out[2] = out[0]
+
+    # direction of movement
+    out[3:7] = DIR_FEATURES[d]
+
+    # food location
+    food = game.food
+    out[7] = food.x < head.x
+    out[8] = food.x > head.x
+    out[9] = food.y < head.y
+    out[10] = food.y > head.y
+
+    return out
+
+
+def encode_states(head, direction, food, rows, cols, grids, out=None):
+    '''
+    Batched encode_state for many games on flat occupancy grids, as kept by
+    VectorSnakeEnv. head and food are flat cell ids (row*cols + col), direction the
+    clockwise direction index and grids a sequence of (n_games, rows*cols) bool arrays,
+    any of which blocks the snake. Returns (n_games, 11), written into out if given.
+    '''
+    n = len(head)
+    if out is None:
+        out = np.zeros((n, STATE_SIZE), dtype=int)
+    games = np.arange(n)
+    row, col = head // cols, head % cols
+
+    # danger straight and right (counter clockwise neighbour), left repeats straight
+    for feature, turn in ((0, 0), (1, -1)):
+        step = DIR_STEPS_ARRAY[(direction + turn) % 4]
+        r, c = row + step[:, 0], col + step[:, 1]
+        blocked = (r < 0) | (r >= rows) | (c < 0) | (c >= cols)
+        cell = np.where(blocked, 0, r*cols + c)
+        for grid in grids:
+            blocked |= grid[games, cell]
+        out[:, feature] = blocked
+    out[:, 2] = out[:, 0]
+
+    # direction of movement
+    out[:, 3:7] = DIR_FEATURES[direction]
+
+    # food location
+    food_row, food_col = food // cols, food % cols
+    out[:, 7] = food_col < col
+    out[:, 8] = food_col > col
+    out[:, 9] = food_row < row
+    out[:, 10] = food_row > row
+
+    return out
+
+
+# channels of the full board observation
+HEAD = 0
+NECK = 1 # body cell right behind the head, gives the heading
+GRID_BODY = 2
+GRID_FOOD = 3
+STATIC_BOMBS = 4
+MOVING_BOMBS = 5
+GRID_CHANNELS = 6
+
+
+def encode_grid(game, out=None):
+    '''
+    Full board observation of a SnakeGameAI as a (6, rows, cols) uint8 array, written
+    into out (allocated if None): head, neck, body, food, static bombs and moving bombs
+    (the first game.counter bombs). Built from the game's occupancy grid, so the cost
+    is a handful of array ops whatever the snake length or bomb count.
+    '''
+    if out is None:
+        out = np.zeros((GRID_CHANNELS, game.rows, game.cols), dtype=np.uint8)
+    else:
+        out.fill(0)
+    grid = game.grid
+
+    np.greater(grid[BODY], 0, out=out[GRID_BODY])
+    np.greater(grid[FOOD], 0, out=out[GRID_FOOD])
+    np.greater(grid[BOMB], 0, out=out[STATIC_BOMBS])
+
+    # head and neck (the head is off the board on the step the snake hits a wall)
+    head = game.snake[0]
+    if 0 <= head.x < game.cols*BLOCK_SIZE and 0 <= head.y < game.rows*BLOCK_SIZE:
+        out[HEAD, int(head.y) // BLOCK_SIZE, int(head.x) // BLOCK_SIZE] = 1
+    neck = game.snake[1]
+    out[NECK, int(neck.y) // BLOCK_SIZE, int(neck.x) // BLOCK_SIZE] = 1
+
+    # moving bombs get their own channel
+    row, col = game.bombs[:game.counter].T
+    out[MOVING_BOMBS, row, col] = 1
+    out[STATIC_BOMBS, row, col] = grid[BOMB, row, col] > 1
+
+    return out
+
+
+def encode_grids(head, neck, food, rows, cols, body_grid, bomb_grid, out=None):
+    '''
+    Batched encode_grid for games on flat occupancy grids, as kept by VectorSnakeEnv
+    (head, neck and food are flat cell ids). Returns (n_games, 6, rows, cols) uint8.
+    All bombs there are static.
+    '''
+    n = len(head)
+    if out is None:
+        out = np.zeros((n, GRID_CHANNELS, rows, cols), dtype=np.uint8)
+    else:
+        out.fill(0)
+    flat = out.reshape(n, GRID_CHANNELS, rows*cols)
+    games = np.arange(n)
+
+    flat[games, HEAD, head] = 1
+    flat[games, NECK, neck] = 1
+    flat[:, GRID_BODY] = body_grid
+    flat[games, GRID_FOOD, food] = 1
+    flat[:, STATIC_BOMBS] = bomb_grid
+
+    return out
@@ -0,0 +1,150 @@
+import numpy as np
+from snake_game import BLOCK_SIZE
+from state import encode_states, encode_grids, DIR_STEPS_ARRAY as DIR_STEPS
+
+# action index -> change in clockwise direction index ([straight, left, right] in the one-hot moves)
+TURNS = np.array([0, 1, -1], dtype=np.int64)
+
+
+class VectorSnakeEnv:
+    '''
+    Steps N snake games at once. Every game follows the rules of SnakeGameAI.play_step
+    (rewards, collisions, timeout, food and a new bomb per food eaten) but lives in numpy
+    arrays: each snake body is a ring buffer of flat cell ids and collisions are looked up
+    in per-game occupancy grids. Finished games are reset automatically inside step().
+
+    Bombs are static here: SnakeGameAI never advances its moving-bomb counter.
+    observation='grid' returns full board observations instead of the 11 features.
+    '''
+
+    def __init__(self, n_envs, w=640, h=480, seed=None, observation='features'):
+        self.n_envs = n_envs
+        self.observation = observation
+        self.w = w
+        self.h = h
+        self.rows = h // BLOCK_SIZE
+        self.cols = w // BLOCK_SIZE
+        self.n_cells = self.rows * self.cols
+        self.rng = np.random.default_rng(seed)
+
+        # snake bodies: ring buffer of flat cell ids, head at body[i, head_idx[i]]
+        self.body = np.zeros((n_envs, self.n_cells), dtype=np.int64)
+        self.head_idx = np.zeros(n_envs, dtype=np.int64)
+        self.length = np.zeros(n_envs, dtype=np.int64)
+
+        # occupancy grids, flattened to (n_envs, rows*cols)
+        self.body_grid = np.zeros((n_envs, self.n_cells), dtype=bool)
+        self.bomb_grid = np.zeros((n_envs, self.n_cells), dtype=bool)
+        self.food = np.zeros(n_envs, dtype=np.int64)
+
+        self.direction = np.zeros(n_envs, dtype=np.int64)
+        self.score = np.zeros(n_envs, dtype=np.int64)
+        self.frame_iteration = np.zeros(n_envs, dtype=np.int64)
+
+        self._all = np.arange(n_envs)
+        self.reset()
+
+    # reset every game and return the stacked states
+    def reset(self):
+        self._reset_games(self._all)
+        return self.get_states()
+
+    def _reset_games(self, idx):
+        if len(idx) == 0:
+            return
+        # snake starts three blocks long in the middle of the board, moving right
+        r, c = self.rows // 2, self.cols // 2
+        start = np.array([r*self.cols + c, r*self.cols + c - 1, r*self.cols + c - 2])
+
+        self.body_grid[idx] = False
+        self.bomb_grid[idx] = False
+        self.body[idx, :3] = start
+        self.head_idx[idx] = 0
+        self.length[idx] = 3
+        self.body_grid[idx[:, None], start[None, :]] = True
+
+        self.direction[idx] = 0
+        self.score[idx] = 0
+        self.frame_iteration[idx] = 0
+
+        self._place_food(idx)
+        self._place_bomb(idx)
+
+    # pick one uniformly random cell per game out of the cells where free[i] is True
+    def _random_free_cell(self, free):
+        rand = self.rng.random(free.shape)
+        rand[~free] = -1.0
+        return rand.argmax(axis=1)
+
+    def _place_food(self, idx):
+        free = ~(self.body_grid[idx] | self.bomb_grid[idx])
+        self.food[idx] = self._random_free_cell(free)
+
+    def _place_bomb(self, idx):
+        free = ~(self.body_grid[idx] | self.bomb_grid[idx])
+        free[np.arange(len(idx)), self.food[idx]] = False
+        self.bomb_grid[idx, self._random_free_cell(free)] = True
+
+    # advance every game by one move
+    # actions: (n_envs,) indices into [straight, left, right] or (n_envs, 3) one-hot moves
+    # returns stacked states, rewards, dones and scores (final score for games that just ended)
+    def step(self, actions):
+        actions = np.asarray(actions)
+        if actions.ndim == 2:
+            actions = actions.argmax(axis=1)
+
+        self.frame_iteration += 1
+
+        # move the heads
+        self.direction = (self.direction + TURNS[actions]) % 4
+        head = self.body[self._all, self.head_idx]
+        row = head // self.cols + DIR_STEPS[self.direction, 0]
+        col = head % self.cols + DIR_STEPS[self.direction, 1]
+
+        # reward is computed against the length with the new head already inserted
+        reward = -1*(self.frame_iteration / ((self.length + 1) * 10))
+
+        # collisions: wall, body (the tail has not moved yet) or bomb
+        out = (row < 0) | (row >= self.rows) | (col < 0) | (col >= self.cols)
+        new_head = np.where(out, 0, row*self.cols + col)
+        hit = out | self.body_grid[self._all, new_head] | self.bomb_grid[self._all, new_head]
+        timeout = self.frame_iteration > 100*(self.length + 1)
+        done = hit | timeout
+        reward[done] = -10
+
+        # insert new heads for the games that keep going
+        alive = self._all[~done]
+        self.head_idx[alive] = (self.head_idx[alive] - 1) % self.n_cells
+        self.body[alive, self.head_idx[alive]] = new_head[alive]
+        self.body_grid[alive, new_head[alive]] = True
+
+        # eat food or move by popping the tail
+        ate = np.zeros(self.n_envs, dtype=bool)
+        ate[alive] = new_head[alive] == self.food[alive]
+        grow = self._all[ate]
+        self.score[grow] += 1
+        reward[grow] = 10
+        self.length[grow] += 1
+        self._place_food(grow)
+        self._place_bomb(grow)
+
+        move = self._all[~done & ~ate]
+        tail = self.body[move, (self.head_idx[move] + self.length[move]) % self.n_cells]
+        self.body_grid[move, tail] = False
+
+        # report final scores, then start finished games over
+        score = self.score.copy()
+        finished = self._all[done]
+        self._reset_games(finished)
+
+        return self.get_states(), reward, done, score
+
+    # states for every game, same layout as Agent.get_state
+    def get_states(self, out=None):
+        head = self.body[self._all, self.head_idx]
+        if self.observation == 'grid':
+            neck = self.body[self._all, (self.head_idx + 1) % self.n_cells]
+            return encode_grids(head, neck, self.food, self.rows, self.cols,
+                                self.body_grid, self.bomb_grid, out)
+        return encode_states(head, self.direction, self.food, self.rows, self.cols,
+                             (self.body_grid, self.bomb_grid), out)